@@ -0,0 +1,405 @@
+"""
+Offline end-to-end benchmark of EventExtractor.run.
+
+A local HTTP server serves a corpus of event pages and a fake OpenAI-compatible chat endpoint, so a run needs
+neither Eventbrite nor OpenAI. Pages are served through the server acting as an HTTP proxy, so the URLs keep
+their real hosts and Eventbrite pages go through process_eventbrite as usual. Each run happens in its own
+process, which reports URLs/sec, p50/p95 per-URL latency and peak RSS.
+
+    python Benchmark.py --urls 500 --llm-latency 0.5 --llm-error-rate 0.02
+    python Benchmark.py --corpus ./Cache/http            # pages recorded in an HTTP cache
+    python Benchmark.py --output results.json --baseline previous.json
+    python Benchmark.py --imports                        # startup time of the entry points
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+import http.server
+from datetime import datetime
+from urllib.parse import urlsplit
+
+
+# The default column mapping of main.py
+COLUMN_MAPPING = {
+    'Event Name': 'The name of the event',
+    'Start': 'The start datetime of the event in the following format: Month Day, Year, Hour:Minute AM/PM',
+    'End': 'The end datetime of the event in the following format: Month Day, Year, Hour:Minute AM/PM',
+    'Location': 'The full address of the event',
+    'Description': 'A description of the event',
+    'Organizer': 'The organizer of the event',
+}
+
+# Page chrome around the event, so parsing and content reduction work on realistically sized pages
+CHROME = ('<nav class="global-nav">' + ''.join(f'<a href="/c/{n}">Category {n}</a>' for n in range(40)) + '</nav>'
+          + '<script>' + 'window.__DATA__ = {"flag": true};' * 200 + '</script>')
+FOOTER = ('<footer>' + ''.join(f'<p>Footer link {n}: terms, privacy, cookie settings and help.</p>'
+                               for n in range(60)) + '</footer>')
+
+EVENTBRITE_PAGE = '''<html><head><title>{name}</title>
+<meta property="event:start_time" content="{start}"><meta property="event:end_time" content="{end}">
+<meta name="twitter:data1" value="{address}"></head><body>{chrome}<main>
+<h1 class="event-title css-0">{name}</h1>
+<div class="has-user-generated-content"><p>{description}</p></div>
+<a class="descriptive-organizer-info__name-link" href="https://www.eventbrite.com/o/organizer-{i}">Organizer {i}</a>
+</main>{footer}</body></html>'''
+
+JSON_LD_PAGE = '''<html><head><title>{name}</title><script type="application/ld+json">{json_ld}</script></head>
+<body>{chrome}<main><h1>{name}</h1><p>{description}</p></main>{footer}</body></html>'''
+
+GENERIC_PAGE = '''<html><head><title>{name}</title></head><body>{chrome}<main><article>
+<h1>{name}</h1><p>Join us on {start_text} at {address} for {description}</p>
+<p>Hosted by Community Group {i}. Free entry, all welcome.</p></article></main>{footer}</body></html>'''
+
+TOPICS = ['a community composting workshop', 'a talk on urban reforestation', 'a jazz night downtown',
+          'a renewable energy meetup', 'a startup pitch evening', 'a farmers market tour', 'a pottery class']
+
+
+def event_fields(i):
+    start = datetime(datetime.now().year + 2, 1 + i % 12, 1 + i % 28, 10 + i % 8)
+    end = start.replace(hour=start.hour + 2)
+    return {
+        'i': i,
+        'name': f"Benchmark Event {i}",
+        'description': TOPICS[i % len(TOPICS)] + '. ' + 'Bring a friend and learn something new. ' * 10,
+        'address': f"{100 + i} Broad Street New York NY 10004",
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'start_text': start.strftime('%B %d, %Y at %I:%M %p'),
+        'chrome': CHROME,
+        'footer': FOOTER,
+    }
+
+
+def synthetic_corpus(count):
+    """
+    Returns {url: page} for count generated pages: Eventbrite pages for process_eventbrite, pages with a
+    JSON-LD Event, and plain pages that need the LLM.
+    """
+    corpus = {}
+    for i in range(count):
+        fields = event_fields(i)
+        if i % 5 < 2:
+            url = f"http://www.eventbrite.com/e/benchmark-event-{i}"
+            page = EVENTBRITE_PAGE.format(**fields)
+        elif i % 5 == 2:
+            json_ld = json.dumps({'@context': 'https://schema.org', '@type': 'Event', 'name': fields['name'],
+                                  'startDate': fields['start'], 'endDate': fields['end'],
+                                  'location': {'@type': 'Place', 'address': fields['address']},
+                                  'description': fields['description'],
+                                  'organizer': {'@type': 'Organization', 'name': f"Organizer {i}"}})
+            url = f"http://events.example.org/event/{i}"
+            page = JSON_LD_PAGE.format(json_ld=json_ld, **fields)
+        else:
+            url = f"http://calendar.example.net/listing/{i}"
+            page = GENERIC_PAGE.format(**fields)
+        corpus[url] = page.encode('utf-8')
+    return corpus
+
+
+def recorded_corpus(cache_dir, count=None):
+    """Returns {url: page} for the first count HTML pages recorded in an HTTPCache directory, served over plain HTTP."""
+    from HTTPCache import HTTPCache
+
+    corpus = {}
+    for url, body in itertools.islice(HTTPCache(cache_dir).html_pages(), count):
+        # The proxy cannot serve HTTPS, so pages are fetched over HTTP from their original host
+        parts = urlsplit(url)
+        corpus[f"http://{parts.netloc}{parts.path}"] = body
+    return corpus
+
+
+def completion(model, content):
+    return {'id': 'chatcmpl-benchmark', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}}
+
+
+def fake_answer(prompt):
+    """Answers an extraction or relevance prompt of EventExtractor in the expected format."""
+    inputs = re.search(r'THERE ARE (\d+) INPUTS', prompt)
+    if inputs:
+        return ';'.join(str(random.randint(0, 5)) for _ in range(int(inputs.group(1))))
+
+    start = datetime(datetime.now().year + 2, 3, 3, 17)
+    record = (f"Benchmark event;{start:%B %d, %Y, %I:%M %p};{start.replace(hour=19):%B %d, %Y, %I:%M %p};"
+              f"22 Broad Street New York NY 10004;A community event;Community Group")
+    pages = re.findall(r'^\s*=== PAGE (\d+) ===\s*$', prompt, flags=re.MULTILINE)
+    if pages:
+        return '\n'.join(f"=== PAGE {number} ===\n{record}" for number in pages)
+    return record
+
+
+class BenchmarkServer(http.server.ThreadingHTTPServer):
+    """
+    Serves corpus pages as an HTTP proxy (GET of an absolute URL) and fake chat completions
+    (POST /v1/chat/completions) after llm_latency seconds, failing llm_error_rate of them.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, corpus, page_latency=0.0, llm_latency=0.0, llm_jitter=0.5, llm_error_rate=0.0):
+        super().__init__(('127.0.0.1', 0), BenchmarkHandler)
+        self.corpus = corpus
+        self.page_latency = page_latency
+        self.llm_latency = llm_latency
+        self.llm_jitter = llm_jitter
+        self.llm_error_rate = llm_error_rate
+        self.llm_requests = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class BenchmarkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if server.page_latency:
+            time.sleep(server.page_latency)
+        parts = urlsplit(self.path)
+        page = server.corpus.get(f"http://{parts.netloc}{parts.path}")
+        if page is None:
+            self.send(404, b'Not found', 'text/plain')
+        else:
+            self.send(200, page, 'text/html; charset=utf-8')
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server._lock:
+            server.llm_requests += 1
+
+        jitter = server.llm_latency * server.llm_jitter
+        time.sleep(max(0.0, random.uniform(server.llm_latency - jitter, server.llm_latency + jitter)))
+
+        if random.random() < server.llm_error_rate:
+            status, message = random.choice([(429, 'Rate limit reached'), (503, 'The server is overloaded')])
+            body = json.dumps({'error': {'message': message, 'type': 'server_error'}}).encode('utf-8')
+            self.send(status, body, 'application/json', {'Retry-After': '0.05'})
+            return
+
+        answer = fake_answer(request['messages'][-1]['content'])
+        self.send(200, json.dumps(completion(request['model'], answer)).encode('utf-8'), 'application/json')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_case(case):
+    """Runs EventExtractor.run once, in this process, as described by case. Returns the measurements."""
+    import resource
+    import io
+    import contextlib
+    import openai
+    from EventExtractor import EventExtractor
+
+    os.chdir(case['workdir'])
+    openai.api_base = case['api_base']
+    os.environ['BENCHMARK_OPENAI_KEY'] = 'sk-benchmark'
+    settings = dict(api_key_env='BENCHMARK_OPENAI_KEY', csv_files=[case['csv_file']],
+                    column_mapping=COLUMN_MAPPING, city='Benchmark', output_dir='Output', num_rows=['MAX'],
+                    http_cache_dir='Cache/http', result_cache_path='Cache/llm_results.sqlite',
+                    url_ledger_path=None, metrics_file='Output/metrics.json')
+    settings.update(case['settings'])
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        extractor = EventExtractor(**settings)
+        extractor.metrics.keep_samples = True
+        start = time.perf_counter()
+        extractor.run(threading.Event())
+        elapsed = time.perf_counter() - start
+
+    with open(extractor.output_file, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))[1:]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    counters = extractor.metrics.counters
+    return {
+        'urls': case['urls'],
+        'seconds': elapsed,
+        'urls_per_sec': case['urls'] / elapsed if elapsed else 0.0,
+        'p50_url_seconds': extractor.metrics.percentile('url', 0.5),
+        'p95_url_seconds': extractor.metrics.percentile('url', 0.95),
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        'peak_rss_mb': peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024,
+        'rows': len(rows),
+        'error_rows': sum(1 for row in rows if row and row[0].startswith('ERROR')),
+        'llm_requests': sum(counters.get(stage, {}).get('requests', 0) for stage in ('extract', 'relevance')),
+        'llm_retries': sum(counters.get(stage, {}).get('retries', 0) for stage in ('extract', 'relevance')),
+    }
+
+
+def benchmark(corpus, settings=None, repeat=1, **server_options):
+    """
+    Serves corpus and runs EventExtractor.run over all of its URLs repeat times, each run in a fresh process
+    with fresh caches. Returns the measurements of every run.
+    """
+    server = BenchmarkServer(corpus, **server_options).start()
+    results = []
+    try:
+        for number in range(repeat):
+            with tempfile.TemporaryDirectory(prefix='event_benchmark_') as workdir:
+                for directory in ('Errors', 'Output', 'Cache'):
+                    os.makedirs(os.path.join(workdir, directory))
+                csv_file = os.path.join(workdir, 'urls_benchmark_Benchmark.csv')
+                with open(csv_file, 'w', newline='', encoding='utf-8') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(['event-href'])
+                    writer.writerows([url] for url in corpus)
+
+                case = {'workdir': workdir, 'csv_file': csv_file, 'urls': len(corpus),
+                        'api_base': server.url + '/v1', 'settings': settings or {},
+                        'result_file': os.path.join(workdir, 'result.json')}
+                # Page requests go through the benchmark server as a proxy; the fake OpenAI endpoint is direct
+                env = dict(os.environ, HTTP_PROXY=server.url, http_proxy=server.url,
+                           NO_PROXY='127.0.0.1,localhost', no_proxy='127.0.0.1,localhost')
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)],
+                               env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+                with open(case['result_file'], encoding='utf-8') as file:
+                    result = json.load(file)
+            result['run'] = number + 1
+            results.append(result)
+            print(format_result(result))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def format_result(result):
+    return (f"Run {result['run']}: {result['urls']} URLs in {result['seconds']:.2f}s, "
+            f"{result['urls_per_sec']:.1f} URLs/sec, p50 {result['p50_url_seconds']:.3f}s, "
+            f"p95 {result['p95_url_seconds']:.3f}s per URL, peak RSS {result['peak_rss_mb']:.1f} MB, "
+            f"{result['llm_requests']} LLM requests ({result['llm_retries']} retries), "
+            f"{result['rows']} rows ({result['error_rows']} errors)")
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def summarize(results):
+    return {
+        'urls_per_sec': median([result['urls_per_sec'] for result in results]),
+        'p50_url_seconds': median([result['p50_url_seconds'] for result in results]),
+        'p95_url_seconds': median([result['p95_url_seconds'] for result in results]),
+        'peak_rss_mb': median([result['peak_rss_mb'] for result in results]),
+    }
+
+
+def regressions(summary, baseline, tolerance):
+    """Returns the measurements that are worse than baseline by more than tolerance (a fraction)."""
+    found = []
+    if summary['urls_per_sec'] < baseline['urls_per_sec'] * (1 - tolerance):
+        found.append(f"throughput {summary['urls_per_sec']:.1f} < {baseline['urls_per_sec']:.1f} URLs/sec")
+    for key in ('p50_url_seconds', 'p95_url_seconds', 'peak_rss_mb'):
+        if summary[key] > baseline[key] * (1 + tolerance):
+            found.append(f"{key} {summary[key]:.3f} > {baseline[key]:.3f}")
+    return found
+
+
+def import_times(repeat=5):
+    """
+    Measures the startup time of the entry points in fresh interpreters, best of repeat, in seconds beyond
+    the interpreter's own startup. cli.py --help should not import any heavy module.
+    """
+    commands = {
+        'interpreter': [sys.executable, '-c', 'pass'],
+        'cli.py --help': [sys.executable, 'cli.py', '--help'],
+        'Worker.py --help': [sys.executable, 'Worker.py', '--help'],
+        'import EventExtractor': [sys.executable, '-c', 'import EventExtractor'],
+    }
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = {}
+    for name, command in commands.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=directory, check=True, capture_output=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times[name] = best
+    interpreter = times.pop('interpreter')
+    return {name: max(0.0, seconds - interpreter) for name, seconds in times.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of EventExtractor.run.")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--urls', type=int, default=200, help="Number of generated pages.")
+    parser.add_argument('--corpus', help="HTTP cache directory of recorded pages to serve instead.")
+    parser.add_argument('--page-latency', type=float, default=0.0, help="Seconds before each page response.")
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Mean seconds per chat completion.")
+    parser.add_argument('--llm-jitter', type=float, default=0.5, help="Latency spread, as a fraction of the mean.")
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help="Fraction of failed chat completions.")
+    parser.add_argument('--settings', default='{}', help="JSON of extra EventExtractor keyword arguments.")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write the results to this JSON file.")
+    parser.add_argument('--baseline', help="Results JSON of an earlier benchmark to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed slowdown against the baseline.")
+    parser.add_argument('--imports', action='store_true', help="Measure the startup time of the entry points.")
+    args = parser.parse_args()
+
+    if args.imports:
+        for name, seconds in import_times().items():
+            print(f"{name:>22}: {seconds * 1000:7.1f} ms")
+        return
+
+    if args.case:
+        case = json.loads(args.case)
+        result = run_case(case)
+        with open(case['result_file'], 'w', encoding='utf-8') as file:
+            json.dump(result, file)
+        return
+
+    corpus = recorded_corpus(args.corpus, args.urls) if args.corpus else synthetic_corpus(args.urls)
+    results = benchmark(corpus, settings=json.loads(args.settings), repeat=args.repeat,
+                        page_latency=args.page_latency, llm_latency=args.llm_latency,
+                        llm_jitter=args.llm_jitter, llm_error_rate=args.llm_error_rate)
+    summary = summarize(results)
+    print(f"Median: {summary['urls_per_sec']:.1f} URLs/sec, p50 {summary['p50_url_seconds']:.3f}s, "
+          f"p95 {summary['p95_url_seconds']:.3f}s per URL, peak RSS {summary['peak_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'summary': summary, 'runs': results, 'options': vars(args)}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['summary']
+        found = regressions(summary, baseline, args.tolerance)
+        if found:
+            print("Regressions against the baseline: " + '; '.join(found))
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import time
+
+
+# How often waits that cannot block on the stop event itself look at it, in seconds
+POLL_SECONDS = 0.2
+
+
+class RunCancelled(Exception):
+    """Raised inside a run's stages once its stop event is set, so they give up their remaining work."""
+    pass
+
+
+def check(stop_event):
+    """Raises RunCancelled if stop_event is set. A stop_event of None never is."""
+    if stop_event is not None and stop_event.is_set():
+        raise RunCancelled()
+
+
+def sleep(seconds, stop_event):
+    """Sleeps for seconds, or raises RunCancelled as soon as stop_event is set."""
+    if stop_event is None:
+        time.sleep(seconds)
+    elif stop_event.wait(seconds):
+        raise RunCancelled()
@@ -0,0 +1,117 @@
+import re
+import threading
+
+from LLMClient import count_tokens
+
+
+# Tags that never carry event details
+NOISE_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'nav', 'button', 'select', 'option'}
+
+# Page chrome that is only noise outside of the event's own main/article region
+CHROME_TAGS = {'header', 'footer'}
+CONTENT_TAGS = {'main', 'article'}
+
+NOISE_ROLES = {'navigation', 'banner', 'contentinfo', 'dialog', 'alertdialog', 'search'}
+NOISE_PATTERN = re.compile(r'cookie|consent|gdpr|newsletter|subscribe|modal|popup|share|social|breadcrumb|'
+                           r'navbar|nav-|menu|sidebar|related|recommend|advert|promo|footer', re.I)
+
+# Candidate event regions, most specific first
+EVENT_SELECTORS = ['[itemtype*="schema.org/Event"]', '[itemtype*="Event"]', 'main', '[role="main"]', 'article',
+                   '#main', '#content']
+
+
+class ContentReducer:
+    """
+    Cuts a page down to the region that describes the event before it is sent to the model.
+
+    Navigation, cookie banners, footers, scripts and similar chrome are skipped, repeated lines are dropped and
+    the remaining text is truncated to token_budget tokens. The parsed document is not modified, so site parsers
+    can still read it afterwards.
+    """
+
+    def __init__(self, token_budget=3000, model='gpt-3.5-turbo', min_region_chars=200):
+        self.token_budget = token_budget
+        self.model = model
+        self.min_region_chars = min_region_chars
+        self.pages = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _in_content(node):
+        parent = node.parent
+        while parent is not None:
+            if parent.tag in CONTENT_TAGS:
+                return True
+            parent = parent.parent
+        return False
+
+    def _is_noise(self, node):
+        if node.tag in NOISE_TAGS:
+            return True
+        if node.tag in CHROME_TAGS and not self._in_content(node):
+            return True
+        attrs = node.attrs
+        if attrs.get('role') in NOISE_ROLES or attrs.get('aria-hidden') == 'true':
+            return True
+        return bool(NOISE_PATTERN.search(f"{attrs.get('class') or ''} {attrs.get('id') or ''}"))
+
+    def _event_region(self, document, body):
+        for selector in EVENT_SELECTORS:
+            region = document.select_one(selector)
+            if region is not None and len(region.text(strip=True)) >= self.min_region_chars:
+                return region
+        return body
+
+    def _truncate(self, text):
+        """
+        Returns the longest prefix of text, cut at a line boundary where there is one, that fits in the token
+        budget. Token density varies along a page, so the cut is found by binary search on counted tokens.
+        """
+        def prefix(end):
+            boundary = text.rfind('\n', 0, end + 1)
+            return text[:boundary if boundary > 0 else end]
+
+        low, high = 0, len(text)  # prefix(low) fits, prefix(high) is the whole text, which does not
+        while high - low > 1:
+            middle = (low + high) // 2
+            if count_tokens(prefix(middle), self.model) <= self.token_budget:
+                low = middle
+            else:
+                high = middle
+        return prefix(low)
+
+    def reduce(self, document):
+        """
+        Returns (reduced text, tokens of the full body text, tokens of the reduced text) for a page parsed with
+        HTMLParsing.parse_html.
+        """
+        body = document.body
+        if body is None:
+            return "", 0, 0
+        tokens_before = count_tokens(body.text("\n", True), self.model)
+
+        seen = set()
+        lines = []
+        for line in self._event_region(document, body).walk_text(skip=self._is_noise):
+            if line not in seen:
+                seen.add(line)
+                lines.append(line)
+        text = "\n".join(lines)
+
+        tokens_after = count_tokens(text, self.model)
+        if tokens_after > self.token_budget:
+            text = self._truncate(text)
+            tokens_after = count_tokens(text, self.model)
+
+        with self._lock:
+            self.pages += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+        return text, tokens_before, tokens_after
+
+    def summary(self):
+        saved = self.tokens_before - self.tokens_after
+        return (f"Content reduction: {self.pages} pages, {self.tokens_before} -> {self.tokens_after} tokens "
+                f"({saved} tokens saved).")
@@ -0,0 +1,92 @@
+import time
+import threading
+from datetime import datetime
+
+
+# Formats tried before dateparser, most likely first. The first is the one the extraction prompt asks for.
+FAST_FORMATS = ['%B %d, %Y, %I:%M %p', '%B %d, %Y %I:%M %p', '%b %d, %Y, %I:%M %p', '%b %d, %Y %I:%M %p',
+                '%B %d, %Y, %H:%M', '%B %d, %Y']
+
+
+class DateParser:
+    """
+    Thread-safe date parsing in three layers: a memo of strings already parsed, strict strptime/ISO formats,
+    and dateparser for everything else. Parsed datetimes are naive, in the event's local time.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.memo_hits = 0
+        self.fast_hits = 0
+        self.fallback_calls = 0
+        self.failures = 0
+        self.fast_seconds = 0.0
+        self.fallback_seconds = 0.0
+        self.fallback_timed = 0
+
+    @staticmethod
+    def parse_fast(date_string):
+        """Parses date_string with the strict formats, or returns None."""
+        try:
+            return datetime.fromisoformat(date_string.replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            pass
+        for date_format in FAST_FORMATS:
+            try:
+                return datetime.strptime(date_string, date_format)
+            except ValueError:
+                continue
+        return None
+
+    @staticmethod
+    def parse_fallback(date_string):
+        import dateparser
+
+        parsed = dateparser.parse(date_string)
+        return parsed.replace(tzinfo=None) if parsed is not None else None
+
+    def parse(self, date_string):
+        """Returns the datetime for date_string, or None if it cannot be parsed."""
+        key = date_string.strip()
+        with self._lock:
+            if key in self._memo:
+                self.memo_hits += 1
+                return self._memo[key]
+
+        start = time.perf_counter()
+        parsed = self.parse_fast(key)
+        fast_elapsed = time.perf_counter() - start
+        fallback_elapsed = 0.0
+        if parsed is None:
+            parsed = self.parse_fallback(key)
+            fallback_elapsed = time.perf_counter() - start - fast_elapsed
+
+        with self._lock:
+            self.fast_seconds += fast_elapsed
+            if fallback_elapsed:
+                # The first call also imports dateparser and loads its language data, so it is not timed
+                if self.fallback_calls:
+                    self.fallback_timed += 1
+                    self.fallback_seconds += fallback_elapsed
+                self.fallback_calls += 1
+                self.failures += parsed is None
+            else:
+                self.fast_hits += 1
+            if len(self._memo) >= self.max_entries:
+                self._memo.clear()
+            self._memo[key] = parsed
+        return parsed
+
+    def summary(self):
+        total = self.memo_hits + self.fast_hits + self.fallback_calls
+        text = (f"Date parsing: {total} dates, {self.memo_hits} memo hits, {self.fast_hits} fast-path parses, "
+                f"{self.fallback_calls} dateparser calls ({self.failures} failed).")
+        if self.fallback_timed:
+            # What the memo and fast-path hits would have cost at the measured dateparser speed
+            average = self.fallback_seconds / self.fallback_timed
+            fast_average = self.fast_seconds / (self.fast_hits + self.fallback_calls)
+            saved = self.memo_hits * average + self.fast_hits * max(average - fast_average, 0.0)
+            text += f" Estimated parse time saved: {saved:.2f} seconds."
+        return text
@@ -1,16 +1,57 @@
 import os
+import re
 import time
 import string
 from urllib.parse import urlparse, urlunparse
 import pandas as pd
 import openai
-import dateparser
 import math
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 import logging
 import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import chain
+
+from Cancellation import POLL_SECONDS, RunCancelled
+from Fetcher import PageFetcher, ordered_map
+from HTTPCache import HTTPCache
+from ResultCache import ResultCache
+from RunJournal import RunJournal
+from EventWriter import EventWriter
+from LLMClient import LLMClient, count_tokens
+from ContentReducer import ContentReducer
+from RelevanceModel import RelevanceModel
+from KeywordFilter import KeywordFilter
+from StructuredData import StructuredData
+from ParserRegistry import ParserRegistry
+from DateParsing import DateParser
+from URLNormalization import split_urls, strip_parameters, url_keys, normalize_url
+from URLLedger import URLLedger
+from Metrics import Metrics
+from NetArchive import NetArchive
+
+
+# Terms the relevance check scores events against
+CLIMATE_TERMS = ['Climate Change', 'Plants', 'Climate', 'Technology', 'Sustainability',
+                 'Environmental Volunteering', 'Environment', 'Climate Tech',
+                 'Renewable Energy', 'Emissions', 'Carbon', 'Agriculture', 'Biodiversity',
+                 'Environmental Policy', 'Climate Awareness', 'Climate Advocacy',
+                 'Reforestation', 'Recycling', 'Human Centric Design', 'Composting', 'Wildlife',
+                 'Earth', 'Soil', 'Urban Modernization', 'Urban Restoration',
+                 'Forestry', 'Ecosystems', 'Climate Investments', 'Climate Startups',
+                 'Climate Legislation', 'Climate Activism', 'Recycled', 'Vintage', 'Compost',
+                 'Vegan', 'Green', 'Sustainable Cities', 'Urbanism', 'Sustainable Nonprofits',
+                 'Sustainable Buildings', 'Sustainable Design', 'Sustainable Architecture',
+                 'Impact Investing', 'Local Produce', 'Farmers Market', 'Vegan Market', 'Vegetables',
+                 'Plant Based']
+
+AI_GOVERNANCE_TERMS = ['AI Governance', 'Ethics', 'Legislation', 'Social Justice', 'Governance']
+
+
+# Registrable label of the hosts handled by process_eventbrite, on every country domain (eventbrite.com,
+# eventbrite.co.uk, eventbrite.at, ...)
+EVENTBRITE_LABEL = 'eventbrite'
 
 
 class PastDateError(Exception):
@@ -24,8 +65,63 @@ class AddressParseError(Exception):
 
 
 class EventExtractor:
-    def __init__(self, api_key_env, csv_files, column_mapping, city, output_dir=None, num_rows=None):
-        """Initializes EventExtractor."""
+    def __init__(self, api_key_env, csv_files, column_mapping, city, output_dir=None, num_rows=None,
+                 max_concurrent_fetches=16, max_fetches_per_host=8, http_cache_dir='./Cache/http',
+                 http_cache_ttl=24 * 3600, result_cache_path='./Cache/llm_results.sqlite',
+                 extraction_model="gpt-3.5-turbo", relevance_model="gpt-4", resume_from=None,
+                 max_concurrent_llm_calls=8, llm_limits=None, llm_request_timeout=60, content_token_budget=3000,
+                 extraction_batch_tokens=2500, max_pages_per_request=8, relevance_backend='llm',
+                 relevance_model_path=None, relevance_confidence=0.8, relevance_terms=None,
+                 keyword_prefilter=True, keyword_accept_terms=3, keyword_reject_min_words=30, html_backend=None,
+                 csv_chunk_size=50000, url_ledger_path='./Cache/url_ledger.sqlite', reprocess_after=None,
+                 output_file=None, metrics_file=None, prometheus_file=None, prometheus_interval=15,
+                 archive_path=None, archive_mode='record', archive_time_scale=1.0, sqlite_journal_mode='WAL'):
+        """
+        Initializes EventExtractor.
+
+        Pass resume_from (the output CSV path of an earlier, unfinished run, or its journal) to continue that run:
+        the output file name is reused and URLs already finished in its journal are skipped.
+
+        Pages for GPT extraction are packed into one request, max_pages_per_request pages and
+        extraction_batch_tokens tokens of page text at most. Pass max_pages_per_request=1 to send one page per request.
+
+        relevance_backend='local' scores relevance with the classifier checkpoint at relevance_model_path (see
+        Train.py) on the CPU; events it scores with less than relevance_confidence confidence go to the LLM.
+
+        relevance_terms defaults to CLIMATE_TERMS. Unless keyword_prefilter is False, events matching at least
+        keyword_accept_terms of the terms are scored 5, and events of keyword_reject_min_words words or more that
+        match none are scored 0, without a relevance request.
+
+        html_backend selects the HTML parser ('selectolax', 'lxml' or 'bs4'); by default the fastest one installed.
+
+        URLs extracted successfully by earlier runs, as recorded in the ledger at url_ledger_path, are skipped.
+        Pass reprocess_after (seconds) to extract events older than that again, or url_ledger_path=None to
+        process every URL.
+
+        output_file sets the output CSV path instead of a new timestamped name in output_dir; the worker
+        processes of a job queue (see Worker.py) use it to share one output.
+
+        Per-stage latency histograms and counters (see Metrics.py) are written to metrics_file at the end of the
+        run, by default next to the output CSV. Pass prometheus_file to also rewrite a Prometheus text file
+        every prometheus_interval seconds while the run goes on.
+
+        archive_path records every HTTP response and LLM call of the run into a NetArchive file, or with
+        archive_mode='replay' serves them back from it without any network, at archive_time_scale times the
+        recorded timings.
+
+        sqlite_journal_mode is the journal mode of the HTTP cache, result cache, URL ledger and archive
+        databases; a job queue shared by several machines (see Worker.py) sets it to 'DELETE'.
+
+        An LLM request gives up after llm_request_timeout seconds and is retried, so a cancelled run never waits
+        longer than that for the requests it had in flight.
+        """
+        if relevance_backend not in ('llm', 'local'):
+            raise ValueError(f"Unknown relevance backend: {relevance_backend}")
+        if relevance_backend == 'local' and not relevance_model_path:
+            raise ValueError("The local relevance backend needs relevance_model_path.")
+        if relevance_backend == 'local':
+            # Fails now rather than in finish, after every page has been fetched and extracted
+            RelevanceModel.check_available(relevance_model_path)
 
         openai.api_key = os.environ[api_key_env]
 
@@ -39,13 +135,73 @@ class EventExtractor:
         sanitized_city = ''.join(c if c in whitelist else '_' for c in self.city)
         self.output_filename = f"{sanitized_city}_events_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.csv"
 
+        if resume_from:
+            resume_base = resume_from[:-len('.journal.jsonl')] if resume_from.endswith('.journal.jsonl') \
+                else os.path.splitext(resume_from)[0]
+            if os.path.exists(resume_base + '.journal.jsonl'):
+                output_dir = os.path.dirname(resume_base) or output_dir
+                self.output_filename = os.path.basename(resume_base) + '.csv'
+            else:
+                print(f"No journal found for {os.path.basename(resume_from)}, starting a new run.")
+
+        if output_file:
+            output_dir = os.path.dirname(output_file) or output_dir
+            self.output_filename = os.path.basename(output_file)
+
         self.error_logger = logging.getLogger('errorLogger')
         self.error_logger.setLevel(logging.ERROR)
         error_handler = logging.FileHandler('./Errors/error_log_' + os.path.splitext(self.output_filename)[0] + '.txt')
         self.error_logger.addHandler(error_handler)
+        self._error_csv_lock = threading.Lock()
 
         self.output_file = os.path.join(output_dir, self.output_filename)
+        self.journal = RunJournal(os.path.splitext(self.output_file)[0] + '.journal.jsonl')
+        self.writer = EventWriter(self.journal, self.output_file, self.column_mapping)
         self.num_rows = num_rows
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.max_fetches_per_host = max_fetches_per_host
+        self.http_cache = HTTPCache(http_cache_dir, ttl=http_cache_ttl, journal_mode=sqlite_journal_mode) \
+            if http_cache_dir else None
+        self.result_cache = ResultCache(result_cache_path, journal_mode=sqlite_journal_mode) \
+            if result_cache_path else None
+        self.extraction_model = extraction_model
+        self.relevance_model = relevance_model
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self.metrics = Metrics()
+        self.metrics_file = metrics_file or os.path.splitext(self.output_file)[0] + '.metrics.json'
+        self.prometheus_file = prometheus_file
+        self.prometheus_interval = prometheus_interval
+        self.archive = NetArchive(archive_path, archive_mode, archive_time_scale, journal_mode=sqlite_journal_mode) \
+            if archive_path else None
+        self.llm = LLMClient(self.error_logger, limits=llm_limits, metrics=self.metrics, archive=self.archive,
+                             request_timeout=llm_request_timeout)
+        self.stop_event = None
+        self.partial = False
+        self.content_reducer = ContentReducer(content_token_budget, model=extraction_model) \
+            if content_token_budget else None
+        self.extraction_batch_tokens = extraction_batch_tokens
+        self.max_pages_per_request = max_pages_per_request
+        self.batched_pages = 0
+        self.batch_requests = 0
+        self.structured_pages = 0
+        self._stats_lock = threading.Lock()
+        self.structured_data = StructuredData(self.column_mapping)
+        self.parsers = ParserRegistry(self.error_logger)
+        self.parsers.register_label(EVENTBRITE_LABEL, EventExtractor.process_eventbrite)
+        # You can add more here: self.parsers.register('someotherwebsite.com', process_someotherwebsite)
+        self.relevance_backend = relevance_backend
+        self.relevance_model_path = relevance_model_path
+        self.relevance_confidence = relevance_confidence
+        self._local_relevance = None
+        self.relevance_terms = list(relevance_terms) if relevance_terms else CLIMATE_TERMS
+        self.keyword_filter = KeywordFilter(self.relevance_terms) if keyword_prefilter else None
+        self.keyword_accept_terms = keyword_accept_terms
+        self.keyword_reject_min_words = keyword_reject_min_words
+        self.html_backend = html_backend
+        self.date_parser = DateParser()
+        self.csv_chunk_size = csv_chunk_size
+        self.url_ledger = URLLedger(url_ledger_path, journal_mode=sqlite_journal_mode) if url_ledger_path else None
+        self.reprocess_after = reprocess_after
 
         print("csv_files: " + ', '.join(os.path.basename(path) for path in self.csv_files))
         print(f"output_file: {os.path.basename(self.output_file)}")
@@ -65,13 +221,21 @@ class EventExtractor:
     def save_offending_row_to_csv(self, row):
         """Save offending row to CSV."""
         filename = './Errors/error_log_' + os.path.splitext(self.output_filename)[0] + '.csv'
-        with open(filename, 'a', newline='') as file:
+        with self._error_csv_lock, open(filename, 'a', newline='') as file:
             writer = csv.writer(file)
             writer.writerow([row])
 
     def read_urls_from_csv(self):
-        """Reads URLs from a CSV file."""
+        """
+        Reads URLs from the CSV files, chunk by chunk.
+
+        URLs are validated and stripped of their query parameters with vectorized string operations, and
+        deduplicated as they are read, across files, by a normalized key (see URLNormalization.url_keys).
+        A file whose first column holds anything but URLs is skipped.
+        """
         all_data = []
+        seen = set()
+        skipped = 0
 
         if isinstance(self.num_rows, int):
             num_rows_list = [self.num_rows] * len(self.csv_files)
@@ -83,34 +247,43 @@ class EventExtractor:
             raise TypeError("Invalid num_rows: Must be an int or a list of equal length to csv_files")
 
         for csv_file, num_rows in zip(self.csv_files, num_rows_list):
-            if num_rows == 'MAX':
-                df = pd.read_csv(csv_file)
-            else:
-                df = pd.read_csv(csv_file, nrows=num_rows)
-
-            # If df is a Series (happens when the CSV has only one row), convert it to a DataFrame
-            if isinstance(df, pd.Series):
-                df = df.to_frame().transpose()
-
-            # Replace NaN values with an empty string
-            df.iloc[:, 0].fillna('', inplace=True)
+            nrows = None if num_rows == 'MAX' else num_rows
+            city = str(csv_file).rsplit('_', 1)[-1].replace('.csv', '')
+
+            # Rows of this file are only kept once the whole file has been validated
+            file_data = []
+            file_keys = set()
+            valid = True
+            for chunk in pd.read_csv(csv_file, nrows=nrows, chunksize=self.csv_chunk_size):
+                parts = split_urls(chunk.iloc[:, 0])
+                if parts['netloc'].isna().any():
+                    valid = False
+                    break
 
-            if not df.iloc[:, 0].apply(self.is_url).all():
+                keys = url_keys(parts)
+                new = ~keys.duplicated() & ~keys.isin(seen) & ~keys.isin(file_keys)
+                if self.url_ledger is not None:
+                    extracted = keys.isin(self.url_ledger.known(keys[new], max_age=self.reprocess_after))
+                    skipped += int((new & extracted).sum())
+                    new &= ~extracted
+                chunk = chunk[new].copy()
+                chunk.iloc[:, 0] = strip_parameters(parts[new])
+                chunk['City'] = city
+                chunk['Source CSV'] = csv_file
+
+                file_keys.update(keys[new])
+                file_data.append(chunk)
+
+            if not valid:
                 print(f"Error: {csv_file} does not contain URLs in the first column.")
                 continue
 
-            df.iloc[:, 0] = df.iloc[:, 0].apply(self.strip_url_parameters)
-
-            df['City'] = str(csv_file).rsplit('_', 1)[-1].replace('.csv', '')
-            df['Source CSV'] = csv_file
-
-            all_data.append(df)
+            seen |= file_keys
+            all_data.extend(file_data)
 
-        final_data = pd.concat(all_data)
-        final_data.reset_index(drop=True, inplace=True)
-
-        # Drop duplicate URLs here after all dataframes have been concatenated
-        final_data.drop_duplicates(subset=final_data.columns[0], keep='first', inplace=True)
+        if skipped:
+            print(f"Skipping {skipped} URLs already extracted by earlier runs.")
+        final_data = pd.concat(all_data, ignore_index=True)
 
         all_urls = final_data.iloc[:, 0].tolist()
         final_additional_data = final_data.iloc[:, 1:]
@@ -118,19 +291,18 @@ class EventExtractor:
         return all_urls, final_additional_data
 
     @staticmethod
-    def extract_body_text(html_content):
-        """Extracts body text from HTML content."""
-        soup = BeautifulSoup(html_content, "lxml")
-        body = soup.body
-        return body.get_text(separator="\n", strip=True) if body else ""
+    def extract_body_text(document):
+        """Extracts body text from a document parsed with HTMLParsing.parse_html."""
+        body = document.body
+        return body.text("\n", True) if body else ""
 
-    @staticmethod
-    def parse_dates(event_details, datetime_fields):
+    def parse_dates(self, event_details, datetime_fields):
         current_datetime = datetime.now()
 
         for i in datetime_fields:
             date_string = event_details[i]
-            parsed_date = dateparser.parse(date_string)
+            with self.metrics.timed('dates'):
+                parsed_date = self.date_parser.parse(date_string)
             if parsed_date is None:
                 raise ValueError(f"Failed to parse date: {date_string}")
             if parsed_date < current_datetime:
@@ -153,9 +325,24 @@ class EventExtractor:
 
         return event_details
 
-    def extract_event_details(self, url_content, url):
-        """Extracts event details using the OpenAI API."""
+    def extract_event_details(self, url_content, url, use_cache=True):
+        """
+        Extracts event details using the OpenAI API.
+
+        Results are memoized by (normalized body text, prompt fields, model). Pass use_cache=False on a retry,
+        so a cached answer that failed validation is replaced instead of being returned again.
+        """
         prompt_fields = ",".join(self.column_mapping.values())
+
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = ResultCache.make_key('extract', ' '.join(url_content.split()),
+                                             list(self.column_mapping.values()), self.extraction_model)
+            if use_cache:
+                cached = self.result_cache.get(cache_key, 'extract')
+                if cached is not None:
+                    return cached
+
         prompt = f"""
         Extract the following information from the event webpage content:
         {prompt_fields},
@@ -164,189 +351,369 @@ class EventExtractor:
 
         ---\n{url_content}\n---"""
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = self.llm.chat(
+            self.extraction_model,
+            [
                 {
                     "role": "system",
                     "content": "You are an event data extractor. All date times should not include timezone. Use a semicolon character ; to delimit different fields extracted. Do not provide field names, just the extracted field.",
                 },
                 {"role": "user", "content": prompt},
             ],
+            stage='extract',
         )
 
-        return response.choices[0]["message"]["content"]
+        details = response.choices[0]["message"]["content"]
+        if cache_key is not None:
+            self.result_cache.put(cache_key, 'extract', details)
+        return details
 
-    @staticmethod
-    def write_events_to_csv(events, additional_data, file_path, fields):
-        """Writes event data to a CSV file."""
-        df_output = pd.DataFrame(events)
-        base_cols = list(fields.keys()) + ['Event URL'] + ['Relevance']
-        if df_output.shape[1] > len(base_cols):
-            extra_cols = [f'Extra{c + 1}' for c in range(df_output.shape[1] - len(base_cols))]
-            df_output.columns = base_cols + extra_cols
-        else:
-            df_output.columns = base_cols
-        df_output = pd.concat([df_output, additional_data.reset_index(drop=True)], axis=1)
-        df_output.to_csv(file_path, index=False)
+    def extract_event_details_batch(self, pages):
+        """
+        Extracts the event details of several pages with one OpenAI API request.
+
+        Each page is sent under a '=== PAGE n ===' marker and the answer is split back on the same markers.
+        Returns {url: details} for the pages found in the cache or in the answer; pages whose record is missing
+        are left out, so the caller can retry them one by one. Records are cached per page, like single requests.
+        """
+        details_by_url = {}
+        pending = []
+        for page in pages:
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = ResultCache.make_key('extract', ' '.join(page.body_text.split()),
+                                                 list(self.column_mapping.values()), self.extraction_model)
+                cached = self.result_cache.get(cache_key, 'extract')
+                if cached is not None:
+                    details_by_url[page.url] = cached
+                    continue
+            pending.append((page, cache_key))
+
+        # A single page goes through the normal per-page request
+        if len(pending) < 2:
+            return details_by_url
+
+        prompt_fields = ",".join(self.column_mapping.values())
+        page_sections = "\n".join(f"=== PAGE {n} ===\n---\n{page.body_text}\n---"
+                                   for n, (page, _) in enumerate(pending, start=1))
+        prompt = f"""
+        Extract the following information from each of the {len(pending)} event webpages below:
+        {prompt_fields},
+        Use the semicolon character ; to delimit each of the fields.
+        Answer with exactly one record per webpage. Start each record with the marker line of its webpage,
+        exactly as given, for example === PAGE 1 ===.
+        The content of the webpages is:
+
+        {page_sections}"""
+
+        response = self.llm.chat(
+            self.extraction_model,
+            [
+                {
+                    "role": "system",
+                    "content": "You are an event data extractor. All date times should not include timezone. Use a semicolon character ; to delimit different fields extracted. Do not provide field names, just the extracted field.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            stage='extract',
+        )
+
+        # re.split with a group gives [preamble, number, record, number, record, ...]
+        content = response.choices[0]["message"]["content"]
+        parts = re.split(r'^\s*=== PAGE (\d+) ===\s*$', content, flags=re.MULTILINE)
+        records = {int(number): record.strip() for number, record in zip(parts[1::2], parts[2::2])}
+
+        for n, (page, cache_key) in enumerate(pending, start=1):
+            details = records.get(n)
+            if not details or details.count(';') != len(self.column_mapping) - 1:
+                continue
+            details_by_url[page.url] = details
+            if cache_key is not None:
+                self.result_cache.put(cache_key, 'extract', details)
+
+        with self._stats_lock:
+            self.batch_requests += 1
+            self.batched_pages += len(pending)
+        return details_by_url
 
     def get_output_file(self):
         """Returns the output file path."""
         return self.output_file
 
-    def check_relevance(self, dataframe, terms, max_prompts_per_request=25):
+    def score_relevance_batch(self, batch_prompts, term_string):
+        """Scores one batch of input strings with a single API request. Raises ValueError on a short answer."""
+        # Prepare the prompt string with all batch prompts included
+        batch_prompts_string = "\n---\n".join(batch_prompts)
+        prompt_string = f"""
+        For each of the following texts, give an INTEGER rating on a scale of 0-5 measuring how relevant the text is to the following terms: {term_string}.
+        THERE ARE {len(batch_prompts)} INPUTS, SO THERE SHOULD BE {len(batch_prompts)} OUTPUTS!
+        The texts are:
+
+        ---\n{batch_prompts_string}\n---"""
+
+        user_message = {
+            "role": "user",
+            "content": f"Check the event relevance. FOLLOW THESE INSTRUCTIONS: {prompt_string}"
+        }
+
+        system = {
+            "role": "system",
+            "content": "You are a relevance checker. Use a semicolon character ; to delimit different fields extracted. Do not provide field names, just the extracted field.",
+        }
+
+        response = self.llm.chat(self.relevance_model, [system, user_message], stage='relevance')
+
+        # Split the model's response by the semicolon character and remove leading/trailing whitespace
+        batch_results = [res.strip() for res in response.choices[0]["message"]["content"].split(';')]
+
+        if len(batch_results) != len(batch_prompts):
+            raise ValueError(
+                f"Received {len(batch_results)} results for {len(batch_prompts)} inputs. Please check the model's responses.")
+        return batch_results
+
+    def relevance_batches(self, indices, prompts, max_prompts_per_request, max_tokens_per_request):
+        """Splits indices into consecutive batches, closed at max_prompts_per_request prompts or max_tokens_per_request tokens."""
+        batches = []
+        batch = []
+        tokens = 0
+        for index in indices:
+            size = count_tokens(prompts[index], self.relevance_model) + 2
+            if batch and (len(batch) >= max_prompts_per_request or tokens + size > max_tokens_per_request):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(index)
+            tokens += size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def relevance_texts(self, urls):
+        """Joins the 'Event Name', 'Description' and 'Organizer' fields of the journaled rows of urls."""
+        fields = list(self.column_mapping)
+        columns = [fields.index(column) for column in RelevanceModel.INPUT_COLUMNS if column in fields] or [0]
+        texts = []
+        for url in urls:
+            row = self.journal.read_row(url)
+            texts.append(' '.join(str(row[column]) if column < len(row) and row[column] is not None else ''
+                                  for column in columns))
+        return texts
+
+    def prefilter_relevance(self, urls, max_prompts_per_request=25):
+        """
+        Scores the clear cases among the journaled rows of urls by keyword matches and journals their scores.
+        Returns the URLs left for the relevance model.
+        """
+        texts = pd.Series(self.relevance_texts(urls), dtype=object)
+        found = self.keyword_filter.count_terms(texts)
+        words = texts.str.count(r'\w+')
+
+        accepted = found >= self.keyword_accept_terms
+        rejected = (found == 0) & (words >= self.keyword_reject_min_words)
+        decided = accepted | rejected
+        scores = accepted.map({True: '5', False: '0'})
+
+        decided_urls = [url for url, is_decided in zip(urls, decided) if is_decided]
+        if decided_urls:
+            self.journal.record_relevance(decided_urls, scores[decided].tolist())
+
+        print(f"Keyword prefilter: {int(accepted.sum())} events accepted and {int(rejected.sum())} rejected of "
+              f"{len(urls)}, avoiding {math.ceil(len(decided_urls) / max_prompts_per_request)} relevance requests.")
+        return [url for url, is_decided in zip(urls, decided) if not is_decided]
+
+    def score_relevance_locally(self, urls):
+        """
+        Scores the journaled rows of urls with the local relevance model and journals the confident scores.
+        Returns the URLs scored with too little confidence, to be checked by the LLM.
+        """
+        if self._local_relevance is None:
+            print(f"Loading the local relevance model from {self.relevance_model_path}...")
+            self._local_relevance = RelevanceModel(self.relevance_model_path)
+
+        probabilities = self._local_relevance.predict(self.relevance_texts(urls))
+        confident = [(url, probability) for url, probability in zip(urls, probabilities)
+                     if max(probability, 1 - probability) >= self.relevance_confidence]
+        if confident:
+            self.journal.record_relevance([url for url, _ in confident],
+                                          [RelevanceModel.to_score(probability) for _, probability in confident])
+
+        scored = {url for url, _ in confident}
+        remaining = [url for url in urls if url not in scored]
+        print(f"Local relevance model scored {len(scored)} of {len(urls)} events; "
+              f"{len(remaining)} low-confidence events go to the LLM.")
+        return remaining
+
+    def check_relevance(self, dataframe, terms, max_prompts_per_request=25, on_batch=None,
+                        max_tokens_per_request=1500, max_attempts=3):
         """
         Method to read input prompts from the dataframe and check their relevance against a list of terms using the GPT API.
-        The method appends the relevance result to the dataframe.
+
+        Batches are sized by prompt count and token count and scored concurrently. A batch that fails, or whose
+        answer has the wrong number of results, is split in half and both halves are retried; a single input is
+        tried max_attempts times. Inputs that still fail are left as None, so the other results are kept.
 
         Parameters:
             terms (list[str]): List of terms against which relevance of the input strings is to be checked.
             max_prompts_per_request (int): Maximum number of input strings to be checked in a single API request.
+            on_batch (callable): Optional function called with (row indices, results) for every completed batch,
+                so finished batches can be checkpointed.
+            max_tokens_per_request (int): Maximum number of input string tokens in a single API request.
+            max_attempts (int): Number of attempts for a single input string before it is given up.
+
+        Returns the list of relevance results, with None for the inputs that could not be scored.
         """
         term_string = ', '.join(terms)
-        input_prompts = [row[0] for row in dataframe]
-        num_prompts = len(input_prompts)
-        num_requests = math.ceil(num_prompts / max_prompts_per_request)
-
-        # Prepare a list to hold the relevance results
-        relevance_results = []
-
-        print("Starting the relevance check process...\n")
-
-        for i in range(num_requests):
-            retries = 0
-
-            while retries < 10:
-                try:
-                    start = i * max_prompts_per_request
-                    end = min((i + 1) * max_prompts_per_request, num_prompts)
-                    batch_prompts = input_prompts[start:end]
-
-                    # Prepare the prompt string with all batch prompts included
-                    batch_prompts_string = "\n---\n".join(batch_prompts)
-                    prompt_string = f"""
-                    For each of the following texts, give an INTEGER rating on a scale of 0-5 measuring how relevant the text is to the following terms: {term_string}.
-                    THERE ARE {len(batch_prompts)} INPUTS, SO THERE SHOULD BE {len(batch_prompts)} OUTPUTS!
-                    The texts are:
-
-                    ---\n{batch_prompts_string}\n---"""
-
-                    user_message = {
-                        "role": "user",
-                        "content": f"Check the event relevance. FOLLOW THESE INSTRUCTIONS: {prompt_string}"
-                    }
-
-                    system = {
-                        "role": "system",
-                        "content": "You are a relevance checker. Use a semicolon character ; to delimit different fields extracted. Do not provide field names, just the extracted field.",
-                    }
-
-                    messages = [system, user_message]
-                    functions = [
-                                    {
-                                        "name": "Check_Relevance",
-                                        "description": "Check the relevance of an event",
-                                            "parameters": {
-                                                "climate_score": {
-                                                    "type": "integer",
-                                                    "description": "How related an event is to the key terms, 0-5"
-                                                }
-                                            },
-                                        "required": ["climate_score"]
-                                    }
-                                ]
-
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4",
-                        messages=messages,
-                        #functions=functions
-                        )
-
-                    # Print out the model's response
-                    print(f"Response for batch {i + 1}:\n{response.choices[0]['message']['content']}\n")
-
-                    # Split the model's response by the semicolon character and remove leading/trailing whitespace
-                    batch_results = [res.strip() for res in response.choices[0]["message"]["content"].split(';')]
-
-                    if len(batch_results) != len(batch_prompts):
-                        raise ValueError(
-                            "Received a different number of results than expected. Please check the model's responses.")
-
-                    #relevance_results.extend([result.lower() == 'true' for result in batch_results])
-                    relevance_results.extend(batch_results)
-                    print(batch_results)
-                    print(relevance_results)
-                    print(f"Iteration {i + 1} of {num_requests} completed successfully.")
+        all_prompts = [row[0] for row in dataframe]
+
+        # Prepare a list to hold the relevance results, filled from the result cache where possible
+        relevance_results = [None] * len(all_prompts)
+        cache_keys = [None] * len(all_prompts)
+        if self.result_cache is not None:
+            for index, prompt in enumerate(all_prompts):
+                cache_keys[index] = ResultCache.make_key('relevance', prompt, list(terms), self.relevance_model)
+                relevance_results[index] = self.result_cache.get(cache_keys[index], 'relevance')
+
+        pending = [index for index, result in enumerate(relevance_results) if result is None]
+        if on_batch and len(pending) < len(all_prompts):
+            cached = [index for index, result in enumerate(relevance_results) if result is not None]
+            on_batch(cached, [relevance_results[index] for index in cached])
+        print(f"{len(all_prompts) - len(pending)} of {len(all_prompts)} relevance results found in the cache.")
+        self.metrics.add('relevance', 'cache_hits', len(all_prompts) - len(pending))
+
+        batches = self.relevance_batches(pending, all_prompts, max_prompts_per_request, max_tokens_per_request)
+        print(f"Starting the relevance check process: {len(pending)} inputs in {len(batches)} batches...\n")
+
+        failed = []
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_llm_calls)
+        try:
+            def submit(batch, attempt=1):
+                future = executor.submit(self.score_relevance_batch, [all_prompts[index] for index in batch],
+                                         term_string)
+                running[future] = (batch, attempt)
+
+            running = {}
+            for batch in batches:
+                submit(batch)
+
+            while running:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    print(f"Relevance check cancelled with {len(running)} batches unfinished.")
                     break
+                done, _ = wait(running, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, attempt = running.pop(future)
+                    try:
+                        batch_results = future.result()
+                    except RunCancelled:
+                        continue
+                    except Exception as e:
+                        print(f"Error in a relevance batch of {len(batch)}: {e}")
+                        self.error_logger.error(f"Error in relevance check batch. Error: {str(e)}")
+                        self.metrics.add('relevance', 'batch_retries')
+                        if len(batch) > 1:
+                            middle = len(batch) // 2
+                            submit(batch[:middle])
+                            submit(batch[middle:])
+                        elif attempt < max_attempts:
+                            submit(batch, attempt + 1)
+                        else:
+                            self.error_logger.error(f"Relevance check failure for: {all_prompts[batch[0]]}")
+                            failed.extend(batch)
+                        continue
 
-                except Exception as e:
-                    retries += 1
-                    print(f"Error in iteration {i + 1}: {e}. Retry {retries} of 10.")
-                    self.error_logger.error(f"Error in relevance check iteration. Error: {str(e)}")
-                    time.sleep(2)  # Optional: sleep for 2 seconds before retrying
-                    if retries == 10:
-                        print("Maximum retries exceeded. Breaking the loop.")
-                        self.error_logger.error(f"Relevance check failure.")
-                        return
-
-        # Append the results to the dataframe
-        print("Relevance check process completed.")
-        print(relevance_results)
-        return (relevance_results)
+                    for index, result in zip(batch, batch_results):
+                        relevance_results[index] = result
+                        if cache_keys[index] is not None:
+                            self.result_cache.put(cache_keys[index], 'relevance', result)
+                    if on_batch:
+                        on_batch(batch, batch_results)
+                    print(f"Relevance batch of {len(batch)} completed: {batch_results}")
+        finally:
+            # A cancelled check does not wait for the requests still in flight
+            cancelled = self.stop_event is not None and self.stop_event.is_set()
+            executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+
+        if failed:
+            print(f"Relevance check failed for {len(failed)} inputs; they are left unscored.")
+        scored = sum(result is not None for result in relevance_results)
+        print(f"Relevance check process completed: {scored} of {len(relevance_results)} inputs scored.")
+        return relevance_results
 
     @staticmethod
-    def process_eventbrite(url):
-        r = requests.get(url)
-        html_content = r.content
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def process_eventbrite(page):
+        document = page.document
 
-        h1 = soup.find('h1', class_='event-title css-0')
-        start_time_meta = soup.find('meta', property=lambda x: x == 'event:start_time' if x else False)
+        h1 = document.select_one('h1.event-title.css-0')
+        start_time_meta = document.select_one('meta[property="event:start_time"]')
         start_time_str = start_time_meta['content']
         start_time = datetime.fromisoformat(start_time_str.replace("Z", "+00:00"))
 
-        end_time_meta = soup.find('meta', property=lambda x: x == 'event:end_time' if x else False)
+        end_time_meta = document.select_one('meta[property="event:end_time"]')
         end_time_str = end_time_meta['content']
         end_time = datetime.fromisoformat(end_time_str.replace("Z", "+00:00"))
 
-        location_meta = soup.find('meta', attrs={'name': 'twitter:data1'})
+        location_meta = document.select_one('meta[name="twitter:data1"]')
         location = location_meta['value']
 
-        description = soup.find('div', class_='has-user-generated-content')
-        organizer = soup.find('a', class_='descriptive-organizer-info__name-link')
-
-        return [h1.get_text(), start_time.strftime('%B %d, %Y, %I:%M %p'),
-                end_time.strftime('%B %d, %Y, %I:%M %p'), location, description.get_text(), organizer['href']]
-
-    def process_url_with_bs(self, url):
-        """Processes a URL with BeautifulSoup."""
+        description = document.select_one('div.has-user-generated-content')
+        organizer = document.select_one('a.descriptive-organizer-info__name-link')
 
-        # Mapping dictionary
-        url_mapping = {
-            'eventbrite': EventExtractor.process_eventbrite,
-            # You can add more here: 'someotherwebsite.com': process_someotherwebsite,
-        }
+        return [h1.text(), start_time.strftime('%B %d, %Y, %I:%M %p'),
+                end_time.strftime('%B %d, %Y, %I:%M %p'), location, description.text(), organizer['href']]
 
-        parser = None
-        for domain, parser_func in url_mapping.items():
-            if domain in url:
-                parser = parser_func
-                break
+    def read_structured_data(self, page):
+        """
+        Returns the page's event details from its JSON-LD/OpenGraph data, validated like a GPT answer,
+        or None if any field is missing or invalid.
+        """
+        datetime_fields = {1, 2}  # indices of datetime fields in event_details
+        address_fields = 3
 
-        if not parser:
-            print(f"No parser found for URL: {url}")
+        event_details = self.structured_data.extract(page.document)
+        if event_details is None:
+            return None
+        try:
+            event_details = self.parse_dates(event_details, datetime_fields)
+            event_details = self.parse_addresses(event_details, address_fields)
+        except (ValueError, IndexError, PastDateError, AddressParseError):
             return None
+        return event_details
 
-        for _ in range(3):
-            try:
-                return parser(url)
-            except Exception as e:
-                print(f"Error processing URL: {url}. Error: {e}")
-                self.error_logger.error(f"Error in URl parser for {url}. Error: {str(e)}")
-        else:
-            print(f"Failed to process URL after 3 attempts: {url}")
-            self.error_logger.error(f"URL parser failure for {url}")
+    def prepare_page(self, page):
+        """
+        Parses a fetched page and extracts the text to send to the model. Runs in the fetch worker threads.
+        Pages with complete structured data need no model and are not reduced. Unless content reduction is
+        disabled (content_token_budget=None), only the event region is kept.
+        """
+        page.document  # Parsed here, so the stages below are timed without the parse
+        with self.metrics.timed('structured_data'):
+            page.structured_details = self.read_structured_data(page)
+        if page.structured_details is not None:
+            self.metrics.add('structured_data', 'pages')
+            return
+
+        if self.content_reducer is None:
+            with self.metrics.timed('body_text'):
+                page.body_text = self.extract_body_text(page.document)
+                page.body_tokens = count_tokens(page.body_text, self.extraction_model)
+            self.metrics.add('body_text', 'tokens', page.body_tokens)
+            return
+
+        with self.metrics.timed('reduce'):
+            page.body_text, tokens_before, tokens_after = self.content_reducer.reduce(page.document)
+        page.body_tokens = tokens_after
+        self.metrics.add('reduce', 'tokens_before', tokens_before)
+        self.metrics.add('reduce', 'tokens_after', tokens_after)
+        self.metrics.add('reduce', 'tokens_saved', tokens_before - tokens_after)
+
+    def process_url_with_bs(self, page):
+        """Processes an already fetched and parsed page with its site parser, once."""
+        if self.parsers.lookup(page.url) is None:
+            print(f"No parser found for URL: {page.url}")
             return None
+        with self.metrics.timed('site_parser'):
+            event_details = self.parsers.parse(page.reuse())
+        self.metrics.add('site_parser', 'pages' if event_details is not None else 'failures')
+        return event_details
 
     def seconds_to_hms(self, seconds):
         """Convert seconds to hours, minutes, and seconds format."""
@@ -355,182 +722,328 @@ class EventExtractor:
         secs = int(seconds % 60)
         return hours, minutes, secs
 
-    def run(self, stop_event):
-        """Runs the event extractor."""
-        event_info = []
-        urls, additional_data = self.read_urls_from_csv()
-        total_urls = len(urls)
-        datetime_fields = {1, 2}  # indices of datetime fields in event_details
-        address_fields = 3
+    def needs_gpt(self, page):
+        """Whether a page goes straight to GPT extraction rather than to its structured data or a site parser."""
+        return page.response is not None and page.structured_details is None \
+            and self.parsers.lookup(page.url) is None
 
-        start_time = time.time()
-
-        for i, url in enumerate(urls, start=1):
-            if stop_event.is_set():
-                break
-
-            current_time = time.time()
-            elapsed_time = current_time - start_time  # Calculate elapsed time for processed URLs
-
-            # Average time per URL
-            if i > 1:  # This is to avoid division by zero for the first URL
-                avg_time_per_url = elapsed_time / (i - 1)
+    def batch_pages(self, items):
+        """
+        Groups consecutive (i, page) items into batches for process_batch. A batch is closed once it holds
+        max_pages_per_request pages for GPT, or once adding the next page would exceed extraction_batch_tokens.
+        """
+        batch = []
+        gpt_pages = 0
+        tokens = 0
+        for item in items:
+            page = item[1]
+            if self.needs_gpt(page):
+                if gpt_pages and (gpt_pages >= self.max_pages_per_request
+                                  or tokens + page.body_tokens > self.extraction_batch_tokens):
+                    yield batch
+                    batch, gpt_pages, tokens = [], 0, 0
+                gpt_pages += 1
+                tokens += page.body_tokens
+            batch.append(item)
+        if batch:
+            yield batch
+
+    def process_batch(self, batch, journal=None):
+        """
+        Extracts the event details of a batch of pages, sending the pages for GPT in one request.
+        Pages whose record is missing or fails validation are retried one by one by process_page.
+        Each finished row is recorded in journal at once, so a cancelled run keeps it even if rows before it in
+        URL order are still in progress. Runs in a worker thread; returns a list of (url, event_details, successful).
+        """
+        results = {}
+
+        def process(item, batched_details=None):
+            url, event_details, successful = self.process_page(item, batched_details)
+            if journal is not None:
+                journal.record_row(url, event_details, ok=successful)
+            results[item[0]] = (url, event_details, successful)
+            # From the start of the page's fetch to its finished row
+            self.metrics.observe('url', time.perf_counter() - item[1].started_at)
+
+        # Pages that need no GPT request are written before the batched request is sent, not after it
+        gpt_items = []
+        for item in batch:
+            if self.needs_gpt(item[1]):
+                gpt_items.append(item)
             else:
-                avg_time_per_url = 0
-
-            # Estimate time remaining
-            estimated_time_remaining = avg_time_per_url * (total_urls - i)
-
-            elapsed_h, elapsed_m, elapsed_s = self.seconds_to_hms(elapsed_time)
-            estimated_h, estimated_m, estimated_s = self.seconds_to_hms(estimated_time_remaining)
-
-            print(
-                f"Processing URL {i} out of {total_urls}. Time elapsed: {elapsed_h}h {elapsed_m}m {elapsed_s}s. Estimated time remaining: {estimated_h}h {estimated_m}m {estimated_s}s.")
+                process(item)
 
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36"
-            }
+        batched_details = {}
+        if len(gpt_items) > 1:
+            try:
+                batched_details = self.extract_event_details_batch([page for _, page in gpt_items])
+            except openai.error.OpenAIError as e:
+                print("OpenAI API error encountered for a batch. Retrying its pages one by one...")
+                self.error_logger.error(f"OpenAI api error occurred for a batch of {len(gpt_items)} URLs. "
+                                        f"Error: {str(e)}")
+        for item in gpt_items:
+            process(item, batched_details.get(item[1].url))
+        return [results[i] for i, _ in batch]
+
+    def process_page(self, item, batched_details=None):
+        """
+        Extracts the event details of one fetched page, with the site parser or with GPT.
+        batched_details is the page's record from a batched request, validated here like any other answer.
+        Runs in a worker thread; returns (url, event_details, successful).
+        """
+        i, page = item
+        url = page.url
+        datetime_fields = {1, 2}  # indices of datetime fields in event_details
+        address_fields = 3
 
-            for _ in range(10):  # Will try 4 times before skipping
+        if page.response is None:
+            event_details = ['ERROR']
+            self.save_offending_row_to_csv(event_details)
+            return url, event_details, False
+
+        if page.structured_details is not None:
+            print(f'Extracted URL {i} from its structured data')
+            with self._stats_lock:
+                self.structured_pages += 1
+            return url, page.structured_details + [self.strip_url_parameters(url)], True
+
+        body_text = page.body_text
+        event_details = []
+        successful = True
+
+        soup_flag = False
+
+        print(f'Attempting to process URL {i} with Beautiful Soup')
+        if self.parsers.lookup(url) is not None:
+            event_details = self.process_url_with_bs(page)
+            if event_details != None:
+                event_details.append(self.strip_url_parameters(url))
+                soup_flag = True
+            else:
+                soup_flag = 'SHIFT'
+
+        if soup_flag == False or soup_flag == 'SHIFT':
+            print(f'Processing URL {i} with GPT')
+            for attempt in range(10):  # Will try 4 times before skipping
+                successful = False  # Create a success flag
+                if attempt:
+                    self.metrics.add('extract', 'validation_retries')
                 try:
-                    response = requests.get(url, headers=headers, timeout=15)
-                    break
-                except (requests.exceptions.RequestException, requests.exceptions.Timeout) as e:
-                    print(f"Error fetching {url}, retrying...")
-                    self.error_logger.error(f"Error fetching {url}. Error: {str(e)}")
-                    time.sleep(5)  # Optional: Wait for 5 seconds before retrying
-            else:  # This will execute if the loop has exhausted all attempts (4 tries in this case) without breaking
-                print(f"Failed to fetch {url} after 10 attempts, moving to next URL.")
-                self.error_logger.error(f"Failure fetching {url}.")
-                event_details = ['ERROR']
-                self.save_offending_row_to_csv(event_details)
-                event_info.append(event_details)
-                continue
-
-            body_text = self.extract_body_text(response.text)
-            event_details = []
-
-            soup_flag = False
-
-            print(f'Attempting to process URL {i} with Beautiful Soup')
-            if 'eventbrite' in url:
-                event_details = self.process_url_with_bs(url)
-                if event_details != None:
-                    event_details.append(self.strip_url_parameters(url))
-                    soup_flag = True
-                else:
-                    soup_flag = 'SHIFT'
-
-            if soup_flag == False or soup_flag == 'SHIFT':
-                print(f'Processing URL {i} with GPT')
-                for _ in range(10):  # Will try 4 times before skipping
-                    successful = False  # Create a success flag
-                    try:
-                        details = self.extract_event_details(body_text, url)
-                        event_details = [detail.replace('\n', '') for detail in
-                                         details.split(';')]  # Removing newline characters
-                        event_details.append(self.strip_url_parameters(url))
-
-                        # Checking if the lengths of the extraction and the column mapping match
-                        if len(event_details) - 1 != len(self.column_mapping):  # subtract 1 because we appended the URL
-                            raise ValueError(
-                                "Event details extraction failed. Retrying...")  # Raise an error to trigger the retry
-
-                        event_details = self.parse_dates(event_details, datetime_fields)
-                        event_details = self.parse_addresses(event_details, address_fields)
-
-                        successful = True
-                        break  # If successful, we break the loop and do not execute the 'else' clause.
-                    except openai.error.OpenAIError as e:
-                        print("OpenAI API error encountered. Retrying in 30 seconds...")
-                        self.error_logger.error(f"OpenAI api error occurred for url {i}. Error: {str(e)}")
-                        time.sleep(30)
-                    except ValueError as e:
-                        print(e)
-                        self.error_logger.error(f"ValueError occurred for url {i}. Error: {str(e)}")
-                        continue
-                    except PastDateError as e:
-                        print(e)
-                        self.error_logger.error(f"PastDateError occurred for url {i}. Error: {str(e)}")
-                        break
-                    except AddressParseError as e:
-                        print(e)
-                        self.error_logger.error(f"AddressParseError occurred for url {i}. Error: {str(e)}")
-                        continue
-                    except Exception as e:
-                        self.error_logger.error(f"General Error occurred for url {i}. Error: {str(e)}")
-                        print(e)
-                        continue
-
-                if soup_flag == 'SHIFT':
-                    if event_details:  # Check if the list is not empty
-                        GPT_row = 'BS to GPT: ' + event_details[0]
-                        self.save_offending_row_to_csv(GPT_row)
-                    else:
-                        GPT_row.append('BS to GPT: ')
-                        self.save_offending_row_to_csv(GPT_row)
-
-                if not successful:
-                    print("Failed to get the correct response from OpenAI. Marking error and moving to next URL.")
-                    if event_details:  # Check if the list is not empty
-                        event_details[0] = 'ERROR ' + event_details[
-                            0]  # Replace the first value in the list with 'ERROR'
-                        self.save_offending_row_to_csv(event_details)
+                    if attempt == 0 and batched_details is not None:
+                        details = batched_details
                     else:
-                        event_details.append('ERROR ')  # If the list is empty, append 'ERROR'
-                        self.save_offending_row_to_csv(event_details)
-
-            event_info.append(event_details)
-
-        terms = ['Climate Change', 'Plants', 'Climate', 'Technology', 'Sustainability',
-                 'Environmental Volunteering', 'Environment', 'Climate Tech',
-                 'Renewable Energy', 'Emissions', 'Carbon', 'Agriculture', 'Biodiversity',
-                 'Environmental Policy', 'Climate Awareness', 'Climate Advocacy',
-                 'Reforestation', 'Recycling', 'Human Centric Design', 'Composting', 'Wildlife',
-                 'Earth', 'Soil', 'Urban Modernization', 'Urban Restoration',
-                 'Forestry', 'Ecosystems', 'Climate Investments', 'Climate Startups',
-                 'Climate Legislation', 'Climate Activism', 'Recycled', 'Vintage', 'Compost'
-                                                                                   'Vegan', 'Green',
-                 'Sustainable Cities', 'Urbanism', 'Sustainable Nonprofits'
-                                                   'Sustainable Buildings', 'Sustainable Design',
-                 'Sustainable Architecture',
-                 'Impact Investing', 'Local Produce', 'Farmers Market', 'Vegan Market', 'Vegetables',
-                 'Plant Based']
-
-        '''terms = ['AI Governance', 'Ethics', 'Legislation', 'Social Justice', 'Governance']'''
-
-        event_info = [row + [value] for row, value in zip(event_info, self.check_relevance(event_info, terms))]
-        self.write_events_to_csv(event_info, additional_data, self.output_file, self.column_mapping)
-        pd.read_csv(self.output_file).pipe(lambda df: df.assign(Relevance=df.apply(
-            lambda row: True if not pd.isna(row['Source CSV']) and 'eventbrite' not in row['Source CSV'].lower() else
-            row['Relevance'], axis=1))).to_csv(self.output_file, index=False)
+                        details = self.extract_event_details(body_text, url, use_cache=attempt == 0)
+                    event_details = [detail.replace('\n', '') for detail in
+                                     details.split(';')]  # Removing newline characters
+                    event_details.append(self.strip_url_parameters(url))
 
-        print(f"The output CSV {self.output_file} has been saved. It contains {len(event_info)} rows.")
+                    # Checking if the lengths of the extraction and the column mapping match
+                    if len(event_details) - 1 != len(self.column_mapping):  # subtract 1 because we appended the URL
+                        raise ValueError(
+                            "Event details extraction failed. Retrying...")  # Raise an error to trigger the retry
+
+                    event_details = self.parse_dates(event_details, datetime_fields)
+                    event_details = self.parse_addresses(event_details, address_fields)
+
+                    successful = True
+                    break  # If successful, we break the loop and do not execute the 'else' clause.
+                except openai.error.OpenAIError as e:
+                    # LLMClient has already waited out rate limits and retried transient errors
+                    print("OpenAI API error encountered. Retrying...")
+                    self.error_logger.error(f"OpenAI api error occurred for url {i}. Error: {str(e)}")
+                except ValueError as e:
+                    print(e)
+                    self.error_logger.error(f"ValueError occurred for url {i}. Error: {str(e)}")
+                    continue
+                except PastDateError as e:
+                    print(e)
+                    self.error_logger.error(f"PastDateError occurred for url {i}. Error: {str(e)}")
+                    break
+                except AddressParseError as e:
+                    print(e)
+                    self.error_logger.error(f"AddressParseError occurred for url {i}. Error: {str(e)}")
+                    continue
+                except RunCancelled:
+                    raise
+                except Exception as e:
+                    self.error_logger.error(f"General Error occurred for url {i}. Error: {str(e)}")
+                    print(e)
+                    continue
+
+            if soup_flag == 'SHIFT':
+                if event_details:  # Check if the list is not empty
+                    GPT_row = 'BS to GPT: ' + event_details[0]
+                    self.save_offending_row_to_csv(GPT_row)
+                else:
+                    GPT_row.append('BS to GPT: ')
+                    self.save_offending_row_to_csv(GPT_row)
+
+            if not successful:
+                print("Failed to get the correct response from OpenAI. Marking error and moving to next URL.")
+                self.metrics.add('extract', 'failed_pages')
+                if event_details:  # Check if the list is not empty
+                    event_details[0] = 'ERROR ' + event_details[
+                        0]  # Replace the first value in the list with 'ERROR'
+                    self.save_offending_row_to_csv(event_details)
+                else:
+                    event_details.append('ERROR ')  # If the list is empty, append 'ERROR'
+                    self.save_offending_row_to_csv(event_details)
 
-        print("Starting the CSV cleaning process...")
-        df = pd.read_csv(self.output_file)
 
-        print("Removing rows that start with 'ERROR'...")
-        df[df.columns[0]] = df[df.columns[0]].fillna("").astype(str)
-        df = df[~df[df.columns[0]].str.startswith("ERROR")]
+        return url, event_details, successful
 
-        print("Removing empty columns...")
-        df = df.dropna(axis=1, how='all')
+    def run(self, stop_event):
+        """Runs the event extractor."""
+        self.start_metrics()
+        try:
+            with self.metrics.timed('read_urls'):
+                urls, additional_data = self.read_urls_from_csv()
+            self.extract(urls, stop_event)
+            self.finish(urls, additional_data, stop_event)
+        finally:
+            self.write_metrics()
+
+    def watch(self, stop_event):
+        """Makes the fetches, LLM calls and their waits give up within a moment once stop_event is set."""
+        self.stop_event = stop_event
+        self.llm.stop_event = stop_event
+        if self.archive is not None:
+            self.archive.stop_event = stop_event
+
+    def start_metrics(self):
+        """Starts the live Prometheus file updates, if a prometheus_file was given."""
+        if self.prometheus_file:
+            self.metrics.start_live(self.prometheus_file, self.prometheus_interval)
+
+    def write_metrics(self):
+        """Writes the run's metrics to metrics_file, and a last time to the Prometheus file."""
+        self.metrics.stop_live()
+        self.metrics.write_json(self.metrics_file)
+        print(self.metrics.summary())
+        print(f"Metrics saved at: {self.metrics_file}")
+
+    def extract(self, urls, stop_event, journal=None):
+        """
+        Fetches and extracts the events of urls, recording each finished row in journal (the run's journal by
+        default). URLs already finished in journal are skipped. Once stop_event is set, the URLs in progress are
+        given up and the method returns.
+        """
+        self.watch(stop_event)
+        journal = self.journal if journal is None else journal
+        completed = journal.completed_urls()
+        pending_urls = [url for url in urls if url not in completed]
+        if len(pending_urls) < len(urls):
+            print(f"Resuming: {len(urls) - len(pending_urls)} of {len(urls)} URLs are already in the journal.")
+        total_urls = len(pending_urls)
 
-        if 'Source CSV' in df.columns:
-            print("Removing the 'Source CSV' column...")
-            df = df.drop('Source CSV', axis=1)
+        start_time = time.time()
 
-        if 'Relevance' in df.columns:
-            relevance_empty = pd.isnull(df['Relevance']).all()
-            if not relevance_empty:
-                print("Removing rows with 'False' in the Relevance column...")
-                df['Relevance'] = df['Relevance'].astype(str)
-                df = df[df['Relevance'].str.strip().str.lower() != 'false']
+        fetcher = PageFetcher(self.error_logger, max_workers=self.max_concurrent_fetches,
+                              max_per_host=self.max_fetches_per_host, cache=self.http_cache,
+                              html_backend=self.html_backend, metrics=self.metrics, archive=self.archive,
+                              stop_event=stop_event)
+        pages = fetcher.fetch_in_order(pending_urls, prepare=self.prepare_page)
+
+        batches = self.batch_pages(enumerate(pages, start=1))
+        extracted = ordered_map(lambda batch: self.process_batch(batch, journal), batches,
+                                self.max_concurrent_llm_calls, stop_event=stop_event)
+        try:
+            # Rows are journaled by process_batch as they finish; this loop only reports progress in URL order
+            for i, _ in enumerate(chain.from_iterable(extracted), start=1):
+                if stop_event.is_set():
+                    break
 
-                print("Removing the 'Relevance' column...")
-                df = df.drop('Relevance', axis=1)
+                current_time = time.time()
+                elapsed_time = current_time - start_time  # Calculate elapsed time for processed URLs
+
+                # Average time per URL, counting this one as processed
+                avg_time_per_url = elapsed_time / i
+
+                # Estimate time remaining
+                estimated_time_remaining = avg_time_per_url * (total_urls - i)
+
+                elapsed_h, elapsed_m, elapsed_s = self.seconds_to_hms(elapsed_time)
+                estimated_h, estimated_m, estimated_s = self.seconds_to_hms(estimated_time_remaining)
+
+                print(
+                    f"Processed URL {i} out of {total_urls}. Time elapsed: {elapsed_h}h {elapsed_m}m {elapsed_s}s. Estimated time remaining: {estimated_h}h {estimated_m}m {estimated_s}s.")
+        except RunCancelled:
+            pass
+        finally:
+            # Drops the queued pages and batches without waiting for the ones in flight
+            extracted.close()
+            pages.close()
+        if stop_event.is_set():
+            print(f"Extraction cancelled: {len(journal.completed_urls() & set(pending_urls))} of {total_urls} "
+                  f"URLs finished.")
+
+        print(fetcher.stats.summary())
+        if self.content_reducer is not None:
+            print(self.content_reducer.summary())
+        if self.http_cache is not None:
+            print(self.http_cache.summary())
+        print(self.parsers.summary())
+        print(self.date_parser.summary())
+        print(f"Structured data: {self.structured_pages} of {total_urls} pages extracted without the LLM.")
+        if self.batch_requests:
+            print(f"Batched extraction: {self.batched_pages} pages in {self.batch_requests} requests.")
+
+    def finish(self, urls, additional_data, stop_event=None):
+        """
+        Scores the relevance of the journaled rows of urls and writes the output and cleaned CSVs.
 
-        new_file_path = "/".join(self.output_file.split("/")[:-1]) + "/Cleaned_" + self.output_file.split("/")[-1]
-        df.to_csv(new_file_path, index=False)
-        print(f"CSV cleaning process completed! File saved at: {new_file_path}")
+        If stop_event is set, before or during the relevance check, the rows finished so far are written to the
+        _PARTIAL CSVs without the remaining relevance scores, and the journal is kept so the run can be resumed.
+        """
+        self.watch(stop_event if stop_event is not None else threading.Event())
+        terms = self.relevance_terms
+
+        # Rows come from the journal, so rows finished by an earlier attempt of this run are included
+        unscored = [url for url in urls if self.journal.has_row(url) and url not in self.journal.relevance]
+        if self.stop_event.is_set():
+            unscored = []
+        if self.keyword_filter is not None and unscored:
+            with self.metrics.timed('relevance_prefilter'):
+                remaining = self.prefilter_relevance(unscored)
+            self.metrics.add('relevance_prefilter', 'decided', len(unscored) - len(remaining))
+            unscored = remaining
+        if self.relevance_backend == 'local' and unscored:
+            with self.metrics.timed('relevance_local'):
+                remaining = self.score_relevance_locally(unscored)
+            self.metrics.add('relevance_local', 'decided', len(unscored) - len(remaining))
+            unscored = remaining
+        with self.metrics.timed('relevance_pass'):
+            self.check_relevance([[self.journal.names[url]] for url in unscored], terms,
+                                 on_batch=lambda indices, results: self.journal.record_relevance(
+                                     [unscored[index] for index in indices], results))
+
+        self.partial = self.stop_event.is_set()
+        if self.partial:
+            print("Run cancelled, writing the partial output and cleaned CSVs...")
+            with self.metrics.timed('finalize'):
+                rows_written = self.writer.finalize(urls, additional_data, partial=True)
+            print(f"The partial output CSV {self.writer.partial_file} has been saved. It contains {rows_written} "
+                  f"of {len(urls)} rows.")
+            print(f"Partial cleaned CSV saved at: {self.writer.partial_cleaned_file}")
+            print(f"Resume the run to finish it; its journal is kept at {self.journal.path}")
+            self.journal.close()
+            return
+
+        print("Writing the output and cleaned CSVs...")
+        with self.metrics.timed('finalize'):
+            rows_written = self.writer.finalize(urls, additional_data)
+        self.writer.remove_partial()
+        print(f"The output CSV {self.output_file} has been saved. It contains {rows_written} rows.")
+        print(f"CSV cleaning process completed! File saved at: {self.writer.cleaned_file}")
+        if self.result_cache is not None:
+            print(self.result_cache.summary())
+        if self.archive is not None:
+            print(self.archive.summary())
+
+        # Only now that the output is written are the URLs recorded as extracted
+        if self.url_ledger is not None:
+            self.url_ledger.record([(normalize_url(url), url, url not in self.journal.failed)
+                                    for url in urls if self.journal.has_row(url)], self.output_file)
+            print(self.url_ledger.summary())
+
+        self.journal.discard()
@@ -0,0 +1,135 @@
+import os
+
+import pandas as pd
+
+
+class EventWriter:
+    """
+    Streams the run's rows into the output CSV and its Cleaned_ copy.
+
+    Rows are recorded in the run journal as they are produced. finalize then reads them back in URL order,
+    chunk by chunk, applies the Relevance override and the cleaning rules as vectorized DataFrame steps, and
+    writes the raw and cleaned CSVs in the same pass, so memory stays bounded by the chunk size.
+
+    A cancelled run writes what it has finished to _PARTIAL copies of both CSVs instead, and keeps its journal
+    so it can be resumed.
+    """
+
+    def __init__(self, journal, output_file, fields, chunk_size=1000):
+        self.journal = journal
+        self.output_file = output_file
+        self.cleaned_file = os.path.join(os.path.dirname(output_file), "Cleaned_" + os.path.basename(output_file))
+        self.fields = list(fields.keys())
+        self.chunk_size = chunk_size
+        self.partial_file = self.partial_path(self.output_file)
+        self.partial_cleaned_file = self.partial_path(self.cleaned_file)
+
+    @staticmethod
+    def partial_path(path):
+        base, extension = os.path.splitext(path)
+        return f"{base}_PARTIAL{extension}"
+
+    def remove_partial(self):
+        """Deletes the partial CSVs of an earlier, cancelled attempt of the run."""
+        for path in (self.partial_file, self.partial_cleaned_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def apply_relevance_override(df):
+        """Events that did not come from an Eventbrite URL list are always relevant."""
+        if 'Source CSV' in df.columns:
+            source = df['Source CSV']
+            override = source.notna() & ~source.astype(str).str.lower().str.contains('eventbrite', regex=False)
+            df['Relevance'] = df['Relevance'].astype(object).mask(override, True)
+        return df
+
+    @staticmethod
+    def remove_errors(df):
+        """Removes rows whose first column starts with 'ERROR' and the 'Source CSV' column."""
+        first = df.columns[0]
+        df[first] = df[first].fillna("").astype(str)
+        df = df[~df[first].str.startswith("ERROR")]
+        return df.drop(columns=['Source CSV'], errors='ignore')
+
+    @staticmethod
+    def remove_irrelevant(df):
+        """Removes rows marked 'False' in the Relevance column, then the column itself."""
+        df = df[df['Relevance'].astype(str).str.strip().str.lower() != 'false']
+        return df.drop(columns=['Relevance'])
+
+    @staticmethod
+    def non_empty_columns(df):
+        return {column for column in df.columns
+                if (df[column].notna() & (df[column].astype(str) != '')).any()}
+
+    def _event_columns(self):
+        extra_count = max(0, self.journal.max_width - len(self.fields) - 1)
+        return self.fields + ['Event URL', 'Relevance'], [f'Extra{c + 1}' for c in range(extra_count)]
+
+    def _build_row(self, url, base_width, extra_count):
+        row = self.journal.read_row(url)
+        base = (row + [None] * base_width)[:base_width]
+        extra = (row[base_width:] + [None] * extra_count)[:extra_count]
+        return base + [self.journal.relevance.get(url)] + extra
+
+    def finalize(self, urls, additional_data, partial=False):
+        """
+        Writes the raw and cleaned CSVs for the journaled rows, in the order of urls.
+
+        Parameters:
+            urls (list[str]): All URLs of the run; URLs without a journaled row are left out.
+            additional_data (DataFrame): The extra input columns, aligned by position with urls.
+            partial (bool): Whether the run was cancelled, so the rows go to the _PARTIAL CSVs.
+
+        Returns the number of rows written to the raw CSV.
+        """
+        positions = [position for position, url in enumerate(urls) if self.journal.has_row(url)]
+        base_columns, extra_columns = self._event_columns()
+        base_width = len(self.fields) + 1
+
+        # The cleaner only filters on Relevance if there is any relevance value at all, overrides included
+        filter_relevance = any(urls[position] in self.journal.relevance for position in positions)
+        if not filter_relevance and 'Source CSV' in additional_data.columns:
+            override = self.apply_relevance_override(pd.DataFrame({
+                'Relevance': None, 'Source CSV': additional_data['Source CSV'].iloc[positions].values}))
+            filter_relevance = override['Relevance'].notna().any()
+
+        output_file, cleaned_file = (self.partial_file, self.partial_cleaned_file) if partial \
+            else (self.output_file, self.cleaned_file)
+        cleaned_tmp = cleaned_file + '.tmp'
+        non_empty = set()
+        cleaned_columns = None
+        with open(output_file, 'w', newline='', encoding='utf-8') as raw_out, \
+                open(cleaned_tmp, 'w', newline='', encoding='utf-8') as cleaned_out:
+            for start in range(0, max(len(positions), 1), self.chunk_size):
+                chunk_positions = positions[start:start + self.chunk_size]
+                records = [self._build_row(urls[position], base_width, len(extra_columns))
+                           for position in chunk_positions]
+                df = pd.DataFrame(records, columns=base_columns + extra_columns)
+                df = pd.concat([df, additional_data.iloc[chunk_positions].reset_index(drop=True)], axis=1)
+                df = self.apply_relevance_override(df)
+                df.to_csv(raw_out, header=start == 0, index=False)
+
+                # Empty columns are judged before the relevance filter, as the cleaner always has
+                cleaned = self.remove_errors(df)
+                non_empty |= self.non_empty_columns(cleaned)
+                if filter_relevance:
+                    cleaned = self.remove_irrelevant(cleaned)
+                cleaned.to_csv(cleaned_out, header=start == 0, index=False)
+                cleaned_columns = list(cleaned.columns)
+
+        # Dropping columns that are empty in every chunk needs a second look at the (smaller) cleaned file
+        empty = [column for column in cleaned_columns if column not in non_empty]
+        if empty:
+            print(f"Removing empty columns: {', '.join(map(str, empty))}")
+            with open(cleaned_file, 'w', newline='', encoding='utf-8') as cleaned_out:
+                usecols = [column for column in cleaned_columns if column in non_empty]
+                for number, chunk in enumerate(pd.read_csv(cleaned_tmp, usecols=usecols, dtype=str,
+                                                           keep_default_na=False, chunksize=self.chunk_size)):
+                    chunk[usecols].to_csv(cleaned_out, header=number == 0, index=False)
+            os.remove(cleaned_tmp)
+        else:
+            os.replace(cleaned_tmp, cleaned_file)
+
+        return len(positions)
@@ -0,0 +1,190 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import requests
+
+from Cancellation import POLL_SECONDS, check, sleep
+from HTTPCache import cached_session
+from HTMLParsing import parse_html
+
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36"
+}
+
+
+def ordered_map(func, items, max_workers, window=None, stop_event=None):
+    """
+    Applies func to every item on a thread pool and yields the results in the original order of items.
+
+    At most `window` items are in flight at once, so a slow item holds back the output but never lets the
+    pool run arbitrarily far ahead of the consumer. Once stop_event is set, RunCancelled is raised instead of
+    waiting any longer. A map that is cancelled or abandoned by its consumer drops its queued items and
+    does not wait for the running ones.
+    """
+    window = window or max_workers * 2
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    finished = False
+
+    def result(future):
+        if stop_event is not None:
+            while not wait([future], timeout=POLL_SECONDS).done:
+                check(stop_event)
+        return future.result()
+
+    try:
+        pending = deque()
+        for item in items:
+            check(stop_event)
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield result(pending.popleft())
+        while pending:
+            yield result(pending.popleft())
+        finished = True
+    finally:
+        executor.shutdown(wait=finished, cancel_futures=not finished)
+
+
+class PageStats:
+    """Thread-safe counters for download and parse work, and for the work saved by reusing pages."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_fetched = 0
+        self.parse_calls = 0
+        self.bytes_saved = 0
+        self.parses_saved = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        return (f"Fetched {self.bytes_fetched} bytes with {self.parse_calls} parse calls. "
+                f"Reusing fetched pages saved {self.bytes_saved} bytes and {self.parses_saved} parse calls.")
+
+
+class Page:
+    """
+    A fetched page. The HTML is parsed at most once, on the first access to `document`, with the HTML parsing
+    backend given (see HTMLParsing).
+    """
+
+    def __init__(self, url, response, stats, backend=None, metrics=None):
+        self.url = url
+        self.response = response
+        self.stats = stats
+        self.backend = backend
+        self.metrics = metrics
+        self.started_at = time.perf_counter()
+        self.body_text = None
+        self.body_tokens = 0
+        self.structured_details = None
+        self._document = None
+
+    @property
+    def document(self):
+        if self._document is None:
+            start = time.perf_counter()
+            self._document = parse_html(self.response.content, self.backend)
+            self.stats.add(parse_calls=1)
+            if self.metrics is not None:
+                self.metrics.observe('parse', time.perf_counter() - start)
+                self.metrics.add('parse', 'bytes', len(self.response.content))
+        return self._document
+
+    def reuse(self):
+        """Records that a consumer used this page instead of downloading and parsing it again."""
+        self.stats.add(bytes_saved=len(self.response.content), parses_saved=1)
+        return self
+
+
+class PageFetcher:
+    """
+    Fetches pages concurrently with a global concurrency cap and a per-host cap. Once stop_event is set,
+    retries stop and fetch_in_order raises RunCancelled.
+    """
+
+    def __init__(self, error_logger, max_workers=16, max_per_host=8, retries=10, retry_delay=5, timeout=15,
+                 cache=None, html_backend=None, metrics=None, archive=None, stop_event=None):
+        self.error_logger = error_logger
+        self.stop_event = stop_event
+        self.metrics = metrics
+        self.html_backend = html_backend
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+        self.session = cached_session(cache, HEADERS, pool_maxsize=max_workers, archive=archive)
+
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self.stats = PageStats()
+
+    def _host_slot(self, url):
+        """Returns the semaphore limiting concurrent requests to the host of url."""
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def count(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.add('fetch', name, amount)
+
+    def fetch(self, url):
+        """Fetches a URL, retrying on network errors. Returns None if every attempt failed."""
+        start = time.perf_counter()
+        for attempt in range(self.retries):
+            check(self.stop_event)
+            try:
+                if self.cache is not None and self.cache.is_fresh(url):
+                    response = self.session.get(url, timeout=self.timeout)
+                else:
+                    with self._host_slot(url):
+                        response = self.session.get(url, timeout=self.timeout)
+                self.stats.add(bytes_fetched=len(response.content))
+                if self.metrics is not None:
+                    self.metrics.observe('fetch', time.perf_counter() - start)
+                self.count('pages')
+                self.count('bytes', len(response.content))
+                return response
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching {url}, retrying...")
+                self.error_logger.error(f"Error fetching {url}. Error: {str(e)}")
+                if attempt + 1 < self.retries:
+                    self.count('retries')
+                sleep(self.retry_delay, self.stop_event)
+
+        print(f"Failed to fetch {url} after {self.retries} attempts, moving to next URL.")
+        self.error_logger.error(f"Failure fetching {url}.")
+        self.count('failures')
+        return None
+
+    def fetch_in_order(self, urls, prepare=None):
+        """
+        Fetches urls concurrently and yields a Page for each one in the original URL order.
+
+        Parameters:
+            urls (list[str]): URLs to fetch.
+            prepare (callable): Optional function applied to each fetched Page in the worker thread,
+                so pages arrive already parsed. Pages whose fetch failed have `response` set to None
+                and are not prepared.
+        """
+        def fetch_and_prepare(url):
+            page = Page(url, None, self.stats, self.html_backend, self.metrics)
+            page.response = self.fetch(url)
+            if page.response is not None and prepare:
+                prepare(page)
+            return page
+
+        return ordered_map(fetch_and_prepare, urls, self.max_workers, stop_event=self.stop_event)
@@ -0,0 +1,284 @@
+"""
+A small HTML parsing layer with interchangeable backends.
+
+parse_html returns the document's root node. Every backend offers the same node API: CSS selection with
+select/select_one, attributes through attrs, get and [] access, and text extraction with text and walk_text.
+The default backend is the fastest one installed: selectolax (lexbor), then lxml.html (which needs cssselect),
+then BeautifulSoup with lxml.
+
+Run this file to benchmark the backends over the pages stored in the HTTP cache:
+
+    python HTMLParsing.py [cache_dir]
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+
+# Tags whose contents are never page text
+SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+
+
+class Node:
+    """An element of a parsed document. Subclasses wrap one backend's element type."""
+
+    tag = None
+
+    @property
+    def attrs(self):
+        raise NotImplementedError
+
+    @property
+    def parent(self):
+        raise NotImplementedError
+
+    def select(self, css):
+        raise NotImplementedError
+
+    def select_one(self, css):
+        found = self.select(css)
+        return found[0] if found else None
+
+    @property
+    def body(self):
+        return self.select_one('body')
+
+    def strings(self, skip=None):
+        """Yields the raw text strings under this node in document order, skipping subtrees where skip(node)."""
+        raise NotImplementedError
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def __getitem__(self, name):
+        return self.attrs[name]
+
+    def _skip_text(self, skip):
+        if skip is None:
+            return lambda node: node.tag in SKIP_TEXT_TAGS
+        return lambda node: node.tag in SKIP_TEXT_TAGS or skip(node)
+
+    def text(self, separator='', strip=False):
+        """Returns the node's text like BeautifulSoup's get_text, without script and style contents."""
+        strings = self.strings(self._skip_text(None))
+        if strip:
+            strings = (string.strip() for string in strings)
+            strings = (string for string in strings if string)
+        return separator.join(strings)
+
+    def walk_text(self, skip=None):
+        """Yields the stripped, non-empty text strings under this node, skipping subtrees where skip(node)."""
+        for string in self.strings(self._skip_text(skip)):
+            string = string.strip()
+            if string:
+                yield string
+
+
+class SoupNode(Node):
+    def __init__(self, node):
+        self.node = node
+        self.tag = node.name
+
+    @property
+    def attrs(self):
+        return {name: ' '.join(value) if isinstance(value, list) else value for name, value in self.node.attrs.items()}
+
+    @property
+    def parent(self):
+        parent = self.node.parent
+        return SoupNode(parent) if parent is not None and parent.name != '[document]' else None
+
+    def select(self, css):
+        return [SoupNode(node) for node in self.node.select(css)]
+
+    def strings(self, skip=None):
+        from bs4.element import Tag, NavigableString, Comment, Declaration, Doctype, CData, ProcessingInstruction
+        skipped_strings = (Comment, Declaration, Doctype, CData, ProcessingInstruction)
+
+        stack = list(reversed(self.node.contents))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, NavigableString):
+                if not isinstance(node, skipped_strings):
+                    yield str(node)
+            elif isinstance(node, Tag) and not (skip and skip(SoupNode(node))):
+                stack.extend(reversed(node.contents))
+
+
+class LxmlNode(Node):
+    def __init__(self, node):
+        self.node = node
+        self.tag = node.tag if isinstance(node.tag, str) else None
+
+    @property
+    def attrs(self):
+        return dict(self.node.attrib)
+
+    @property
+    def parent(self):
+        parent = self.node.getparent()
+        return LxmlNode(parent) if parent is not None else None
+
+    def select(self, css):
+        return [LxmlNode(node) for node in self.node.cssselect(css)]
+
+    def strings(self, skip=None):
+        # An element's text comes before its children, and each child's tail after that child
+        stack = []
+        for child in reversed(self.node):
+            stack.append(child.tail)
+            stack.append(child)
+        if self.node.text:
+            yield self.node.text
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if isinstance(node, str):
+                yield node
+                continue
+            # Comments and processing instructions have a non-string tag; only their tail is text
+            if not isinstance(node.tag, str) or (skip and skip(LxmlNode(node))):
+                continue
+            for child in reversed(node):
+                stack.append(child.tail)
+                stack.append(child)
+            if node.text:
+                stack.append(node.text)
+
+
+class LexborNode(Node):
+    def __init__(self, node):
+        self.node = node
+        self.tag = node.tag
+
+    @property
+    def attrs(self):
+        return {name: value if value is not None else '' for name, value in self.node.attributes.items()}
+
+    @property
+    def parent(self):
+        parent = self.node.parent
+        return LexborNode(parent) if parent is not None and parent.is_element_node else None
+
+    def select(self, css):
+        return [LexborNode(node) for node in self.node.css(css)]
+
+    def strings(self, skip=None):
+        stack = list(reversed(list(self.node.iter(include_text=True))))
+        while stack:
+            node = stack.pop()
+            if node.is_text_node:
+                yield node.text_content or ''
+            elif node.is_element_node and not (skip and skip(LexborNode(node))):
+                stack.extend(reversed(list(node.iter(include_text=True))))
+
+
+def available_backends():
+    """Returns the installed backends, fastest first."""
+    available = []
+    try:
+        import selectolax.lexbor  # noqa: F401
+        available.append('selectolax')
+    except ImportError:
+        pass
+    try:
+        import lxml.html  # noqa: F401
+        import cssselect  # noqa: F401
+        available.append('lxml')
+    except ImportError:
+        pass
+    available.append('bs4')
+    return available
+
+
+_default_backend = None
+
+
+def default_backend():
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = available_backends()[0]
+    return _default_backend
+
+
+def parse_html(content, backend=None):
+    """Parses an HTML document (bytes or str) with backend, or the default backend, and returns its root node."""
+    backend = backend or default_backend()
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(content)
+        return LexborNode(tree.root) if tree.root is not None else LexborNode(LexborHTMLParser('<html></html>').root)
+    if backend == 'lxml':
+        import lxml.html
+        from lxml.etree import ParserError
+        # Without a charset declaration lxml assumes Latin-1; read valid UTF-8 as UTF-8
+        parser = None
+        if isinstance(content, bytes):
+            try:
+                content.decode('utf-8')
+                parser = lxml.html.HTMLParser(encoding='utf-8')
+            except UnicodeDecodeError:
+                pass
+        try:
+            return LxmlNode(lxml.html.document_fromstring(content, parser=parser))
+        except ParserError:
+            # An empty document
+            return LxmlNode(lxml.html.document_fromstring('<html></html>'))
+    if backend == 'bs4':
+        from bs4 import BeautifulSoup
+        return SoupNode(BeautifulSoup(content, "lxml"))
+    raise ValueError(f"Unknown HTML parsing backend: {backend}")
+
+
+def cached_pages(cache_dir):
+    """Yields the bodies of the HTML pages stored in an HTTPCache directory, each distinct body once."""
+    from HTTPCache import HTTPCache
+
+    for _, body in HTTPCache(cache_dir).html_pages(distinct=True):
+        yield body
+
+
+def benchmark_backend(backend, cache_dir, rounds=3):
+    """Parses every cached page, extracts its body text and runs a few selectors. Returns pages/sec and peak RSS."""
+    import resource
+
+    pages = list(cached_pages(cache_dir))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for content in pages:
+            document = parse_html(content, backend)
+            body = document.body
+            if body is not None:
+                body.text("\n", True)
+            document.select('script[type="application/ld+json"]')
+            document.select_one('meta[property="og:title"]')
+            document.select('a[href]')
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return {'backend': backend, 'pages': len(pages) * rounds,
+            'pages_per_sec': len(pages) * rounds / elapsed if elapsed else 0.0, 'peak_rss_mb': peak_mb}
+
+
+def benchmark(cache_dir='./Cache/http', rounds=3):
+    """Benchmarks every installed backend, each in its own process so peak memory is measured separately."""
+    results = []
+    for backend in available_backends():
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--backend', backend, cache_dir,
+                                 str(rounds)], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output))
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--backend':
+        print(json.dumps(benchmark_backend(sys.argv[2], sys.argv[3], int(sys.argv[4]))))
+    else:
+        cache_dir = sys.argv[1] if len(sys.argv) > 1 else './Cache/http'
+        for result in benchmark(cache_dir):
+            print(f"{result['backend']:>10}: {result['pages_per_sec']:8.1f} pages/sec, "
+                  f"peak RSS {result['peak_rss_mb']:.1f} MB ({result['pages']} pages)")
@@ -0,0 +1,285 @@
+import os
+import io
+import gzip
+import json
+import time
+import zlib
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from SQLiteStorage import open_sqlite
+
+
+# Headers describing the transfer rather than the content. Bodies are stored decoded, so these are dropped.
+HOP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+
+class HTTPCache:
+    """
+    Content-addressed on-disk cache of HTTP responses.
+
+    Bodies are stored gzip-compressed under their SHA-256 digest, so the same page served under several URLs
+    is stored once. An SQLite index maps each URL to its body and to the metadata used for TTL expiry,
+    ETag/Last-Modified revalidation and size-based LRU eviction. A body is deleted once no URL refers to it, and
+    a body file that cannot be read is treated as a miss. The stored size is counted from the index, so worker
+    processes sharing the cache keep to one budget. journal_mode is the SQLite journal mode of the index (see
+    SQLiteStorage.open_sqlite).
+    """
+
+    def __init__(self, cache_dir='./Cache/http', ttl=24 * 3600, max_bytes=2 * 1024 ** 3, journal_mode='WAL'):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        os.makedirs(os.path.join(cache_dir, 'bodies'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = open_sqlite(os.path.join(cache_dir, 'index.sqlite'), journal_mode)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY, digest TEXT, status INTEGER, headers TEXT,
+                etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL);
+            CREATE TABLE IF NOT EXISTS bodies (digest TEXT PRIMARY KEY, size INTEGER);
+            CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+            CREATE INDEX IF NOT EXISTS responses_digest ON responses (digest);
+        ''')
+        self.total_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _body_path(self, digest):
+        return os.path.join(self.cache_dir, 'bodies', digest[:2], digest + '.gz')
+
+    def lookup(self, url):
+        """
+        Returns the cached entry for url as a dict, body included, or None if the URL is not cached or its body
+        cannot be read.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT digest, status, headers, etag, last_modified, stored_at '
+                                   'FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self._db.commit()
+
+        digest, status, headers, etag, last_modified, stored_at = row
+        try:
+            body = self.load_body(digest)
+        except (OSError, EOFError, zlib.error):
+            # Deleted or corrupt body file: every URL stored with it is refetched
+            self.discard_body(digest)
+            return None
+        return {'digest': digest, 'body': body, 'status': status, 'headers': json.loads(headers), 'etag': etag,
+                'last_modified': last_modified, 'fresh': time.time() - stored_at < self.ttl}
+
+    def is_fresh(self, url):
+        """Checks if url can be served from the cache without touching the network."""
+        with self._lock:
+            row = self._db.execute('SELECT stored_at FROM responses WHERE url = ?', (url,)).fetchone()
+        return row is not None and time.time() - row[0] < self.ttl
+
+    def load_body(self, digest):
+        with open(self._body_path(digest), 'rb') as file:
+            return gzip.decompress(file.read())
+
+    def html_pages(self, distinct=False):
+        """
+        Yields (url, body) for every cached HTML page, skipping bodies that cannot be read. With distinct, a body
+        stored under several URLs is yielded once.
+        """
+        query = 'SELECT url, digest, headers FROM responses WHERE status = 200 ORDER BY rowid'
+        with self._lock:
+            rows = self._db.execute(query).fetchall()
+        seen = set()
+        for url, digest, headers in rows:
+            content_type = CaseInsensitiveDict(json.loads(headers)).get('Content-Type')
+            if 'html' not in (content_type or 'text/html').lower() or (distinct and digest in seen):
+                continue
+            try:
+                body = self.load_body(digest)
+            except (OSError, EOFError, zlib.error):
+                continue
+            seen.add(digest)
+            yield url, body
+
+    @contextmanager
+    def _transaction(self):
+        """Holds the database write lock, across processes, for the enclosed block. Caller holds the lock."""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def _stored_bytes(self):
+        return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+
+    def _drop_body(self, digest):
+        """
+        Deletes the body digest if no URL refers to it any more. Returns the bytes freed. Caller holds the write
+        transaction.
+        """
+        if self._db.execute('SELECT 1 FROM responses WHERE digest = ?', (digest,)).fetchone():
+            return 0
+        row = self._db.execute('SELECT size FROM bodies WHERE digest = ?', (digest,)).fetchone()
+        self._db.execute('DELETE FROM bodies WHERE digest = ?', (digest,))
+        try:
+            os.remove(self._body_path(digest))
+        except FileNotFoundError:
+            pass
+        return row[0] if row else 0
+
+    def discard_body(self, digest):
+        """Forgets a body that cannot be read, with every URL stored with it."""
+        with self._lock:
+            with self._transaction():
+                self._db.execute('DELETE FROM responses WHERE digest = ?', (digest,))
+                self._drop_body(digest)
+                self.total_bytes = self._stored_bytes()
+
+    def store(self, url, response):
+        """Stores a successful response for url."""
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS}
+
+        path = self._body_path(digest)
+        with self._lock:
+            # Within the write transaction, so no other process evicts the body between its write and its row
+            with self._transaction():
+                known = self._db.execute('SELECT 1 FROM bodies WHERE digest = ?', (digest,)).fetchone()
+                if not known or not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    compressed = gzip.compress(body)
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'wb') as file:
+                        file.write(compressed)
+                    os.replace(tmp_path, path)
+                    self._db.execute('INSERT OR REPLACE INTO bodies (digest, size) VALUES (?, ?)',
+                                     (digest, len(compressed)))
+
+                previous = self._db.execute('SELECT digest FROM responses WHERE url = ?', (url,)).fetchone()
+                now = time.time()
+                self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (url, digest, response.status_code, json.dumps(headers),
+                                  response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now))
+                if previous is not None and previous[0] != digest:
+                    self._drop_body(previous[0])
+
+                self.total_bytes = self._stored_bytes()
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
+
+    def refresh(self, url, response):
+        """Marks the entry for url as fresh again after a 304 Not Modified revalidation."""
+        with self._lock:
+            self._db.execute('UPDATE responses SET stored_at = ?, etag = COALESCE(?, etag), '
+                             'last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                             (time.time(), response.headers.get('ETag'), response.headers.get('Last-Modified'), url))
+            self._db.commit()
+
+    def _evict(self):
+        """
+        Drops bodies no URL refers to, then least recently used entries, until the stored bodies fit in
+        max_bytes. Caller holds the write transaction.
+        """
+        target = self.max_bytes * 0.9
+        orphans = self._db.execute('SELECT digest FROM bodies WHERE digest NOT IN '
+                                   '(SELECT digest FROM responses)').fetchall()
+        for digest, in orphans:
+            self.total_bytes -= self._drop_body(digest)
+
+        rows = self._db.execute('SELECT url, digest FROM responses ORDER BY accessed_at').fetchall()
+        for url, digest in rows:
+            if self.total_bytes <= target:
+                break
+            self._db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self.total_bytes -= self._drop_body(digest)
+
+    def build_response(self, request, entry):
+        """Builds a requests Response for request from a cached entry."""
+        body = entry['body']
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        return response
+
+    def summary(self):
+        return (f"HTTP cache: {self.hits} hits, {self.revalidated} revalidated, {self.misses} misses, "
+                f"{self.total_bytes} bytes stored.")
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter serving GET requests from an HTTPCache and revalidating stale entries."""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        entry = self.cache.lookup(request.url)
+        if entry is not None and entry['fresh']:
+            self.cache.count('hits')
+            return self.cache.build_response(request, entry)
+
+        if entry is not None:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            self.cache.count('revalidated')
+            self.cache.refresh(request.url, response)
+            response.close()
+            return self.cache.build_response(request, entry)
+
+        self.cache.count('misses')
+        if response.status_code == 200:
+            self.cache.store(request.url, response)
+        return response
+
+
+def cached_session(cache=None, headers=None, pool_maxsize=10, archive=None):
+    """
+    Creates a requests Session whose GET requests go through cache. A cache of None gives a plain Session.
+    With a NetArchive, the session's requests are recorded into it or replayed from it.
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    if cache is not None:
+        adapter = CachingAdapter(cache, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    if archive is not None:
+        from NetArchive import ArchiveAdapter
+        adapter = ArchiveAdapter(archive, adapter)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
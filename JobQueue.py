@@ -0,0 +1,146 @@
+import json
+import time
+from contextlib import contextmanager
+
+from SQLiteStorage import open_sqlite
+
+
+class JobQueue:
+    """
+    Persistent SQLite queue of extraction jobs, shared by worker processes on one machine or on several machines
+    with a shared filesystem. A queue for several machines is created with multi_host=True, which keeps it in
+    SQLite's rollback journal mode: write-ahead logging does not work on a network filesystem.
+
+    Each job is a slice of the run's URLs. A worker claims a job for lease_seconds and renews the lease while it
+    works; a job whose lease runs out (its worker crashed) is claimed again by another worker, up to
+    max_attempts times. The queue also stores the extractor settings and the run's input rows, so workers and
+    the final merge need nothing else.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        # isolation_level=None: transactions are explicit, so a claim can take the write lock up front.
+        # journal_mode=None: the journal mode chosen by create is kept in the database file.
+        self._db = open_sqlite(path, journal_mode=None, isolation_level=None)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS inputs (position INTEGER PRIMARY KEY, url TEXT, data TEXT);
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY, urls TEXT, status TEXT, worker TEXT, lease_until REAL,
+                attempts INTEGER DEFAULT 0, finished_at REAL);
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+        ''')
+
+    @classmethod
+    def create(cls, path, settings, urls, additional_data, job_size=50, multi_host=False):
+        """
+        Creates a queue for urls, split into jobs of job_size URLs, with the extractor settings to use.
+        Pass multi_host=True if workers on other machines will use it.
+        """
+        queue = cls(path)
+        queue._db.execute(f"PRAGMA journal_mode={'DELETE' if multi_host else 'WAL'}")
+        with queue._transaction():
+            queue._db.execute('DELETE FROM config')
+            queue._db.execute('DELETE FROM inputs')
+            queue._db.execute('DELETE FROM jobs')
+            queue._db.executemany('INSERT INTO config (key, value) VALUES (?, ?)', [
+                ('settings', json.dumps(settings)),
+                ('columns', json.dumps([str(column) for column in additional_data.columns])),
+            ])
+            records = additional_data.astype(object).where(additional_data.notna(), None).values.tolist()
+            queue._db.executemany('INSERT INTO inputs (position, url, data) VALUES (?, ?, ?)',
+                                  [(position, url, json.dumps(record, default=str))
+                                   for position, (url, record) in enumerate(zip(urls, records))])
+            queue._db.executemany("INSERT INTO jobs (urls, status) VALUES (?, 'pending')",
+                                  [(json.dumps(urls[start:start + job_size]),)
+                                   for start in range(0, len(urls), job_size)])
+        return queue
+
+    @contextmanager
+    def _transaction(self):
+        # Takes the write lock up front, so two workers cannot claim the same job
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def get_config(self, key, default=None):
+        row = self._db.execute('SELECT value FROM config WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_config(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def inputs(self):
+        """Returns the run's URLs and their additional input data, as read_urls_from_csv returned them."""
+        import pandas as pd
+
+        rows = self._db.execute('SELECT url, data FROM inputs ORDER BY position').fetchall()
+        urls = [url for url, _ in rows]
+        additional_data = pd.DataFrame([json.loads(data) for _, data in rows], columns=self.get_config('columns'))
+        return urls, additional_data
+
+    def claim(self, worker, lease_seconds):
+        """Claims the next pending or expired job for worker. Returns (job id, urls), or None if there is none."""
+        now = time.time()
+        with self._transaction():
+            # Jobs whose worker died too often are given up
+            self._db.execute("UPDATE jobs SET status = 'failed', finished_at = ? WHERE status = 'leased' "
+                             "AND lease_until < ? AND attempts >= ?", (now, now, self.max_attempts))
+            row = self._db.execute("SELECT id, urls FROM jobs WHERE status = 'pending' "
+                                   "OR (status = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1",
+                                   (now,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, "
+                             "attempts = attempts + 1 WHERE id = ?", (worker, now + lease_seconds, row[0]))
+        return row[0], json.loads(row[1])
+
+    def renew(self, job_id, worker, lease_seconds):
+        """Extends worker's lease on a job. Returns False if the job is no longer leased to worker."""
+        with self._transaction():
+            cursor = self._db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? "
+                                      "AND status = 'leased'", (time.time() + lease_seconds, job_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker):
+        with self._transaction():
+            self._db.execute("UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ? AND worker = ?",
+                             (time.time(), job_id, worker))
+
+    def job_ids(self):
+        return [row[0] for row in self._db.execute('SELECT id FROM jobs ORDER BY id').fetchall()]
+
+    def counts(self):
+        """Returns the number of jobs per status."""
+        return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def finished(self):
+        """Whether every job is done or given up."""
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+    def claim_merge(self, worker, force=False):
+        """
+        Lets exactly one worker merge the finished jobs. Returns True for that worker. force takes over the claim
+        of a merge that did not complete, but a completed merge is never claimed again: its job journals are gone.
+        """
+        with self._transaction():
+            if self.merged() or (self.get_config('merged_by') is not None and not force):
+                return False
+            self.set_config('merged_by', worker)
+        return True
+
+    def mark_merged(self):
+        """Records that the output was written, once the merge completed."""
+        self.set_config('merged_at', time.time())
+
+    def merged(self):
+        return self.get_config('merged_at') is not None
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,59 @@
+import re
+
+import pandas as pd
+
+
+# Checked in order; the first matching suffix is stripped
+SUFFIXES = ('ability', 'ation', 'able', 'ing', 'ies', 'ed', 'es', 'er', 's', 'e')
+
+
+def stem(word):
+    """A light suffix-stripping stemmer, so 'Recycling', 'Recycled' and 'recycle' share the stem 'recycl'."""
+    word = word.lower()
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+# Endings added to a stem to list a word's inflections; a term matches only these, as whole words
+INFLECTIONS = ('', 's', 'e', 'es', 'ed', 'ing', 'er', 'ers', 'al', 'able', 'ability', 'ation', 'ations')
+
+
+def inflections(word):
+    """Lists the inflected forms of word matched by a term, e.g. 'recycle', 'recycled', 'recycling'."""
+    word = word.lower()
+    base = stem(word)
+    forms = {word} | {base + ending for ending in INFLECTIONS}
+    if base.endswith('y'):
+        forms |= {base[:-1] + 'ies', base[:-1] + 'ied'}
+    # Longest first, so the alternation does not stop at a shorter form
+    return sorted(forms, key=lambda form: (-len(form), form))
+
+
+class KeywordFilter:
+    """
+    Matches a list of terms against many texts in one compiled regular expression.
+
+    Each term matches its words and their inflections (see inflections) as whole words, case-insensitively, with
+    any whitespace or hyphens between the words of a multi-word term: 'Carbon' matches 'carbons' but not
+    'carbonara'.
+    """
+
+    def __init__(self, terms):
+        self.terms = list(dict.fromkeys(terms))
+        alternatives = []
+        for number, term in enumerate(self.terms):
+            words = ['(?:' + '|'.join(map(re.escape, inflections(word))) + ')' for word in re.findall(r'\w+', term)]
+            alternatives.append(f"(?P<t{number}>" + r'\b' + r'[\s\-]+'.join(words) + r'\b)')
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE)
+
+    def count_terms(self, texts):
+        """Returns a Series with the number of distinct terms found in each text."""
+        texts = pd.Series(texts, dtype=object).fillna('').astype(str).reset_index(drop=True)
+        matches = texts.str.extractall(self.pattern)
+        if matches.empty:
+            return pd.Series(0, index=texts.index)
+        found = matches.notna().groupby(level=0).any().sum(axis=1)
+        return found.reindex(texts.index, fill_value=0).astype(int)
+
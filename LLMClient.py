@@ -0,0 +1,209 @@
+import time
+import threading
+from email.utils import parsedate_to_datetime
+
+import openai
+
+from Cancellation import check, sleep
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Requests-per-minute and tokens-per-minute budgets per model. Set these to the account's actual limits.
+DEFAULT_LIMITS = {
+    'gpt-3.5-turbo': {'rpm': 3500, 'tpm': 90000},
+    'gpt-4': {'rpm': 200, 'tpm': 10000},
+}
+
+RETRYABLE_ERRORS = (openai.error.APIError, openai.error.Timeout, openai.error.APIConnectionError,
+                    openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+_encodings = {}
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """
+    Counts the tokens of text for model. Without tiktoken, or if its encoding files cannot be downloaded,
+    estimates four characters per token.
+    """
+    if tiktoken is not None and model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encodings[model] = None
+    encoding = _encodings.get(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenBucket:
+    """A thread-safe token bucket refilled continuously at per_minute tokens per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount, stop_event=None):
+        """Blocks until amount tokens are available, then takes them. Raises RunCancelled once stop_event is set."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                else:
+                    wait = (amount - self.tokens) / self.rate
+            sleep(wait, stop_event)
+
+    def adjust(self, amount):
+        """Returns (or, if negative, takes) tokens once the actual cost of a request is known."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def pause(self, seconds):
+        """Blocks every acquire for the next seconds, e.g. after the server asked us to back off."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def retry_after(error):
+    """Reads the Retry-After delay in seconds from an OpenAI error, or returns None if the server sent none."""
+    headers = getattr(error, 'headers', None) or {}
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class LLMClient:
+    """
+    Thread-safe OpenAI chat client that keeps every model within its requests-per-minute and tokens-per-minute
+    budget, so many threads can keep requests in flight at the account's actual limit. Rate-limit errors pause
+    the model's budget for the server's Retry-After delay; transient errors are retried with backoff.
+
+    With metrics (see Metrics.py), every call records its request latency, budget wait, retries and token usage
+    under the stage it is made for. With an archive (see NetArchive.py), calls are recorded or replayed.
+
+    Once stop_event is set, calls waiting for their budget or a retry raise RunCancelled. A request in flight
+    cannot be interrupted, so each one gives up after request_timeout seconds (and is retried, unless stopped).
+    """
+
+    def __init__(self, error_logger, limits=None, max_retries=6, completion_estimate=400, metrics=None,
+                 archive=None, stop_event=None, request_timeout=60):
+        self.error_logger = error_logger
+        self.request_timeout = request_timeout
+        self.stop_event = stop_event
+        self.metrics = metrics
+        self.archive = archive
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_retries = max_retries
+        self.completion_estimate = completion_estimate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _buckets_for(self, model):
+        with self._lock:
+            if model not in self._buckets:
+                limits = self.limits.get(model, self.limits['gpt-3.5-turbo'])
+                self._buckets[model] = (TokenBucket(limits['rpm']), TokenBucket(limits['tpm']))
+            return self._buckets[model]
+
+    def count(self, stage, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.add(stage, name, amount)
+
+    def observe(self, stage, start):
+        if self.metrics is not None:
+            self.metrics.observe(stage, time.perf_counter() - start)
+
+    def chat(self, model, messages, stage='llm', **kwargs):
+        """
+        Sends a chat completion request once the model's budgets allow it and returns the response.
+        stage names the pipeline stage the request is made for in the metrics.
+        """
+        requests_bucket, tokens_bucket = self._buckets_for(model)
+        expected = sum(count_tokens(message['content'], model) + 4 for message in messages)
+        expected += kwargs.get('max_tokens', self.completion_estimate)
+        kwargs.setdefault('request_timeout', self.request_timeout)
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.count(stage, 'retries')
+            check(self.stop_event)
+            wait_start = time.perf_counter()
+            requests_bucket.acquire(1, self.stop_event)
+            tokens_bucket.acquire(expected, self.stop_event)
+            start = time.perf_counter()
+            self.count(stage, 'budget_wait_seconds', start - wait_start)
+            try:
+                if self.archive is not None:
+                    response = self.archive.chat(openai.ChatCompletion.create, model=model, messages=messages,
+                                                 **kwargs)
+                else:
+                    response = openai.ChatCompletion.create(model=model, messages=messages, **kwargs)
+            except openai.error.RateLimitError as e:
+                self.observe(stage, start)
+                delay = retry_after(e)
+                delay = delay if delay is not None else min(60, 2 ** attempt)
+                print(f"Rate limited on {model}, pausing for {delay:.1f} seconds...")
+                self.error_logger.error(f"Rate limit on {model}. Error: {str(e)}")
+                requests_bucket.pause(delay)
+                tokens_bucket.pause(delay)
+                self.count(stage, 'rate_limited')
+                error = e
+                continue
+            except RETRYABLE_ERRORS as e:
+                self.observe(stage, start)
+                delay = retry_after(e) or min(60, 2 ** attempt)
+                print(f"OpenAI API error on {model}, retrying in {delay:.1f} seconds...")
+                self.error_logger.error(f"OpenAI API error on {model}. Error: {str(e)}")
+                sleep(delay, self.stop_event)
+                error = e
+                continue
+            except Exception:
+                self.observe(stage, start)
+                self.count(stage, 'failures')
+                raise
+            self.observe(stage, start)
+
+            usage = response.get('usage') or {}
+            if 'total_tokens' in usage:
+                tokens_bucket.adjust(expected - usage['total_tokens'])
+            self.count(stage, 'requests')
+            self.count(stage, 'prompt_tokens', usage.get('prompt_tokens', 0))
+            self.count(stage, 'completion_tokens', usage.get('completion_tokens', 0))
+            return response
+
+        self.count(stage, 'failures')
+        raise error
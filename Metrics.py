@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, like a Prometheus histogram, plus the minimum and maximum."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimates the q-quantile by interpolating within its bucket, as Prometheus' histogram_quantile does."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts)},
+        }
+
+
+class Metrics:
+    """
+    Thread-safe per-stage metrics of an extraction run: a latency histogram and named counters (retries,
+    bytes, tokens, ...) for every stage, such as fetch, parse, extract or relevance.
+
+    write_json saves everything at the end of a run. start_live rewrites a Prometheus text file every few
+    seconds while the run goes on, for node_exporter's textfile collector or any scraper that reads files.
+
+    Set keep_samples to also keep every observation, for exact percentiles (see Benchmark.py).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, keep_samples=False):
+        self.buckets = buckets
+        self.keep_samples = keep_samples
+        self.samples = {}
+        self.histograms = {}
+        self.counters = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._live = None
+
+    def observe(self, stage, seconds):
+        """Records one latency observation for stage."""
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram(self.buckets)
+            self.histograms[stage].observe(seconds)
+            if self.keep_samples:
+                self.samples.setdefault(stage, []).append(seconds)
+
+    def percentile(self, stage, q):
+        """Returns the exact q-quantile of the kept samples of stage, or None without samples."""
+        with self._lock:
+            samples = sorted(self.samples.get(stage, []))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def add(self, stage, name, amount=1):
+        """Adds amount to the counter name of stage."""
+        with self._lock:
+            counters = self.counters.setdefault(stage, {})
+            counters[name] = counters.get(name, 0) + amount
+
+    @contextmanager
+    def timed(self, stage):
+        """Times the enclosed block as one observation of stage, failed or not."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            stages = sorted(set(self.histograms) | set(self.counters))
+            return {
+                'started_at': self.started_at,
+                'elapsed_seconds': round(time.time() - self.started_at, 3),
+                'stages': {stage: {'latency_seconds': self.histograms[stage].to_dict()
+                                   if stage in self.histograms else None,
+                                   'counters': dict(self.counters.get(stage, {}))}
+                           for stage in stages},
+            }
+
+    @staticmethod
+    def _write_atomic(path, text):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+    def write_json(self, path):
+        self._write_atomic(path, json.dumps(self.snapshot(), indent=2))
+
+    def prometheus_text(self, prefix='event_extractor'):
+        with self._lock:
+            lines = [f'# HELP {prefix}_stage_seconds Latency of each extraction stage.',
+                     f'# TYPE {prefix}_stage_seconds histogram']
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines += [f'# HELP {prefix}_stage_total Counters of each extraction stage.',
+                      f'# TYPE {prefix}_stage_total counter']
+            for stage, counters in sorted(self.counters.items()):
+                for name, value in sorted(counters.items()):
+                    lines.append(f'{prefix}_stage_total{{stage="{stage}",counter="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        self._write_atomic(path, self.prometheus_text())
+
+    def start_live(self, path, interval=15):
+        """Rewrites the Prometheus text file at path every interval seconds until stop_live."""
+        if self._live is not None:
+            return
+        stop = threading.Event()
+
+        def update():
+            while not stop.wait(interval):
+                self.write_prometheus(path)
+
+        thread = threading.Thread(target=update, daemon=True)
+        thread.start()
+        self._live = (path, stop, thread)
+
+    def stop_live(self):
+        """Stops the live updates, after a last one."""
+        if self._live is None:
+            return
+        path, stop, thread = self._live
+        stop.set()
+        thread.join()
+        self.write_prometheus(path)
+        self._live = None
+
+    def summary(self):
+        snapshot = self.snapshot()
+        lines = ["Stage metrics:"]
+        for stage, data in snapshot['stages'].items():
+            text = f"  {stage}:"
+            latency = data['latency_seconds']
+            if latency:
+                text += (f" {latency['count']} calls, {latency['sum']:.2f}s total, "
+                         f"p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s.")
+            if data['counters']:
+                text += ' ' + ', '.join(f"{name} {value:g}" for name, value in sorted(data['counters'].items()))
+            lines.append(text)
+        return '\n'.join(lines)
@@ -0,0 +1,196 @@
+import io
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from Cancellation import sleep
+from HTTPCache import HOP_HEADERS
+from SQLiteStorage import open_sqlite
+
+
+class NetArchive:
+    """
+    Single-file archive of a run's network interactions: every HTTP response and every LLM request/response
+    pair, errors included, with how long each took. Payloads are zlib-compressed in an SQLite file, indexed
+    by request.
+
+    In 'record' mode interactions go to the network and are appended to the archive. In 'replay' mode they are
+    served from the archive without any network, after their recorded duration multiplied by time_scale
+    (1 keeps the recorded timings, 0 replays as fast as possible). A request made several times is replayed
+    in recorded order, the last recording repeating. Requests missing from the archive get a 404 response
+    or an InvalidRequestError. Once stop_event is set, a replay still waiting out its duration raises
+    RunCancelled.
+
+    Record with the HTTP and LLM result caches off (http_cache_dir=None, result_cache_path=None) for an archive
+    that replays the whole load; otherwise record and replay with the same cache state.
+    """
+
+    def __init__(self, path, mode='record', time_scale=1.0, journal_mode='WAL'):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        if mode == 'replay' and not os.path.exists(path):
+            raise FileNotFoundError(f"No archive to replay at {path}")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self.stop_event = None
+        self.recorded = 0
+        self.replayed = 0
+        self.missed = 0
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._db = open_sqlite(path, journal_mode)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY, kind TEXT, key TEXT, request BLOB, status INTEGER, headers TEXT,
+                body BLOB, error TEXT, elapsed REAL, recorded_at REAL);
+            CREATE INDEX IF NOT EXISTS records_key ON records (kind, key, id);
+        ''')
+        self._db.commit()
+
+    @staticmethod
+    def llm_key(request):
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _record(self, kind, key, request, status=None, headers=None, body=None, error=None, elapsed=0.0):
+        with self._lock:
+            self._db.execute('INSERT INTO records (kind, key, request, status, headers, body, error, elapsed, '
+                             'recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (kind, key, zlib.compress(json.dumps(request).encode('utf-8')), status,
+                              json.dumps(headers) if headers is not None else None,
+                              zlib.compress(body) if body is not None else None,
+                              json.dumps(error) if error is not None else None, elapsed, time.time()))
+            self._db.commit()
+            self.recorded += 1
+
+    def _replay(self, kind, key):
+        """Returns the next recording of key as (status, headers, body, error), or None if there is none."""
+        query = 'SELECT status, headers, body, error, elapsed FROM records WHERE kind = ? AND key = ? ORDER BY id'
+        with self._lock:
+            position = self._positions.get((kind, key), 0)
+            row = self._db.execute(query + ' LIMIT 1 OFFSET ?', (kind, key, position)).fetchone()
+            if row is not None:
+                self._positions[(kind, key)] = position + 1
+            elif position:
+                # Past the last recording, the last one repeats
+                row = self._db.execute(query + ' DESC LIMIT 1', (kind, key)).fetchone()
+            if row is None:
+                self.missed += 1
+                return None
+            self.replayed += 1
+
+        status, headers, body, error, elapsed = row
+        if self.time_scale:
+            sleep(elapsed * self.time_scale, self.stop_event)
+        return (status, json.loads(headers) if headers else {}, zlib.decompress(body) if body is not None else None,
+                json.loads(error) if error else None)
+
+    def http(self, request, send):
+        """Sends a prepared requests request with send, or replays it. Returns a requests Response."""
+        key = f"{request.method} {request.url}"
+        if self.mode == 'replay':
+            recording = self._replay('http', key)
+            if recording is None:
+                return self.build_response(request, 404, {'X-Archive': 'miss'}, b'')
+            status, headers, body, error = recording
+            if error is not None:
+                raise requests.exceptions.ConnectionError(error['message'], request=request)
+            return self.build_response(request, status, headers, body)
+
+        start = time.perf_counter()
+        try:
+            response = send(request)
+        except requests.exceptions.RequestException as e:
+            self._record('http', key, {'method': request.method, 'url': request.url},
+                         error={'type': type(e).__name__, 'message': str(e)}, elapsed=time.perf_counter() - start)
+            raise
+        body = response.content
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in HOP_HEADERS}
+        self._record('http', key, {'method': request.method, 'url': request.url}, status=response.status_code,
+                     headers=headers, body=body, elapsed=time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def build_response(request, status, headers, body):
+        response = requests.Response()
+        response.status_code = status
+        response.reason = 'OK' if status < 400 else 'Not Found' if status == 404 else 'Error'
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def chat(self, create, **request):
+        """Calls create (openai.ChatCompletion.create) with request, or replays the call."""
+        import openai
+
+        # Client options, such as the request timeout, do not change the answer
+        options = {name: request.pop(name) for name in ('request_timeout',) if name in request}
+        key = self.llm_key(request)
+        if self.mode == 'replay':
+            recording = self._replay('llm', key)
+            if recording is None:
+                raise openai.error.InvalidRequestError("The request is not in the archive.", None)
+            status, headers, body, error = recording
+            if error is not None:
+                raise self.openai_error(error, status, headers)
+            return openai.util.convert_to_openai_object(json.loads(body))
+
+        start = time.perf_counter()
+        try:
+            response = create(**request, **options)
+        except openai.error.OpenAIError as e:
+            self._record('llm', key, request, status=e.http_status, headers=dict(e.headers or {}),
+                         error={'type': type(e).__name__, 'message': e.user_message},
+                         elapsed=time.perf_counter() - start)
+            raise
+        self._record('llm', key, request, status=200, body=json.dumps(response).encode('utf-8'),
+                     elapsed=time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def openai_error(error, status, headers):
+        """Rebuilds a recorded OpenAI error, with the headers LLMClient reads Retry-After from."""
+        import openai
+
+        error_class = getattr(openai.error, error['type'], openai.error.OpenAIError)
+        try:
+            return error_class(error['message'], http_status=status, headers=CaseInsensitiveDict(headers))
+        except TypeError:
+            # Errors with extra required arguments, such as InvalidRequestError
+            return openai.error.OpenAIError(error['message'], http_status=status,
+                                            headers=CaseInsensitiveDict(headers))
+
+    def summary(self):
+        if self.mode == 'record':
+            return f"Network archive: {self.recorded} interactions recorded to {self.path}."
+        return f"Network archive: {self.replayed} interactions replayed from {self.path}, {self.missed} missing."
+
+    def close(self):
+        self._db.close()
+
+
+class ArchiveAdapter(BaseAdapter):
+    """Transport adapter recording the requests sent through adapter into a NetArchive, or replaying them."""
+
+    def __init__(self, archive, adapter):
+        super().__init__()
+        self.archive = archive
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        return self.archive.http(request, lambda prepared: self.adapter.send(prepared, **kwargs))
+
+    def close(self):
+        self.adapter.close()
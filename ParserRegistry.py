@@ -0,0 +1,115 @@
+import threading
+from urllib.parse import urlparse
+
+
+# Second-level labels under a country code that are part of the public suffix, as in co.uk or com.au
+SECOND_LEVEL_LABELS = {'co', 'com', 'org', 'net', 'ac', 'gov', 'edu'}
+
+
+def registrable_label(host):
+    """
+    Returns the label of host just left of its public suffix, e.g. 'eventbrite' for www.eventbrite.co.uk,
+    www.eventbrite.at or eventbrite.co.
+    """
+    labels = host.lower().split('.')
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return labels[-3]
+    return labels[-2] if len(labels) >= 2 else ''
+
+
+class ParserHealth:
+    """Call and failure counts of one site parser."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.disabled = False
+
+
+class ParserRegistry:
+    """
+    Site parsers keyed by host name, or by registrable label for sites with a domain per country.
+
+    A URL's parser is found by looking up its host, then each parent domain (www.example.com, example.com), then
+    the host's registrable label (eventbrite for www.eventbrite.co.uk), so lookups cost a few dict probes however
+    many parsers are registered. Parsers are called once per page: a page whose DOM does not match fails straight
+    to the LLM. A parser that fails max_consecutive_failures pages in a row is assumed broken by a site redesign
+    and is disabled for the rest of the run.
+    """
+
+    def __init__(self, error_logger, max_consecutive_failures=5):
+        self.error_logger = error_logger
+        self.max_consecutive_failures = max_consecutive_failures
+        self.parsers = {}
+        self.labels = {}
+        self.health = {}
+        self._lock = threading.Lock()
+
+    def register(self, domains, parser):
+        """Registers parser for each of domains and their subdomains. parser takes a Page and returns a row."""
+        for domain in ([domains] if isinstance(domains, str) else domains):
+            self.parsers[domain.lower()] = parser
+        self.health.setdefault(parser, ParserHealth(parser.__name__))
+
+    def register_label(self, label, parser):
+        """Registers parser for every host whose registrable label is label, whatever its country domain."""
+        self.labels[label.lower()] = parser
+        self.health.setdefault(parser, ParserHealth(parser.__name__))
+
+    @staticmethod
+    def host(url):
+        return (urlparse(url).hostname or '').lower()
+
+    def lookup(self, url):
+        """Returns the enabled parser for url, or None."""
+        host = self.host(url)
+        labels = host.split('.')
+        parser = None
+        for start in range(len(labels) - 1):
+            parser = self.parsers.get('.'.join(labels[start:]))
+            if parser is not None:
+                break
+        if parser is None:
+            parser = self.labels.get(registrable_label(host))
+        if parser is None or self.health[parser].disabled:
+            return None
+        return parser
+
+    def parse(self, page):
+        """
+        Parses page with its site parser. Returns the row, or None if there is no enabled parser or it failed.
+        """
+        parser = self.lookup(page.url)
+        if parser is None:
+            return None
+        health = self.health[parser]
+        try:
+            row = parser(page)
+        except Exception as e:
+            print(f"Error processing URL: {page.url}. Error: {e}")
+            self.error_logger.error(f"Error in URl parser for {page.url}. Error: {str(e)}")
+            with self._lock:
+                health.calls += 1
+                health.failures += 1
+                health.consecutive_failures += 1
+                if health.consecutive_failures >= self.max_consecutive_failures and not health.disabled:
+                    health.disabled = True
+                    print(f"Disabling parser {health.name} after {health.consecutive_failures} failures in a row.")
+                    self.error_logger.error(f"URL parser {health.name} disabled after "
+                                            f"{health.consecutive_failures} consecutive failures")
+            return None
+
+        with self._lock:
+            health.calls += 1
+            health.consecutive_failures = 0
+        return row
+
+    def summary(self):
+        lines = []
+        for health in self.health.values():
+            if health.calls:
+                state = ' (disabled)' if health.disabled else ''
+                lines.append(f"{health.name}: {health.calls} pages, {health.failures} failures{state}")
+        return "Site parsers: " + ('; '.join(lines) if lines else "not used") + "."
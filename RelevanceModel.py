@@ -0,0 +1,64 @@
+import os
+
+
+class RelevanceModel:
+    """
+    Runs a relevance classifier fine-tuned by Train.py locally, with batched CPU inference.
+
+    Inputs are joined like the training data ('Event Name', 'Description' and 'Organizer'). torch and transformers
+    are imported when the model is loaded, so they are only needed when this backend is used.
+    """
+
+    # The columns Train.py joins into the classifier input
+    INPUT_COLUMNS = ['Event Name', 'Description', 'Organizer']
+
+    # Packages the model needs, checked without importing them
+    REQUIRED_PACKAGES = ['torch', 'transformers']
+
+    @classmethod
+    def check_available(cls, model_path):
+        """Raises before a run starts if model_path does not exist or torch or transformers is not installed."""
+        import importlib.util
+
+        if not os.path.isdir(model_path):
+            raise ValueError(f"No relevance model checkpoint at {model_path}.")
+        missing = [package for package in cls.REQUIRED_PACKAGES if importlib.util.find_spec(package) is None]
+        if missing:
+            raise ImportError(f"The local relevance backend needs {' and '.join(missing)}; "
+                              f"install them with pip install {' '.join(missing)}.")
+
+    def __init__(self, model_path, batch_size=32, max_length=512):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        self.model.eval()
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        # Train.py labels relevant events "True"; fall back to the second logit as Evaluate.py does
+        label2id = {str(label): index for label, index in (self.model.config.label2id or {}).items()}
+        self.true_index = label2id.get('True', 1)
+
+    def predict(self, texts):
+        """Returns the probability that each text is relevant, in the order of texts."""
+        # Batching texts of similar length keeps padding, and so wasted compute, low
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        probabilities = [0.0] * len(texts)
+        with self.torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                inputs = self.tokenizer([texts[index] for index in batch], truncation=True,
+                                        max_length=self.max_length, padding=True, return_tensors="pt")
+                logits = self.model(**inputs).logits
+                batch_probabilities = self.torch.nn.functional.softmax(logits, dim=-1)[:, self.true_index]
+                for index, probability in zip(batch, batch_probabilities.tolist()):
+                    probabilities[index] = probability
+        return probabilities
+
+    @staticmethod
+    def to_score(probability):
+        """Maps a probability of relevance onto the 0-5 relevance scale used by the LLM backend."""
+        return str(round(probability * 5))
@@ -0,0 +1,79 @@
+import json
+import time
+import hashlib
+import threading
+
+from SQLiteStorage import open_sqlite
+
+
+class ResultCache:
+    """
+    Persistent cache of LLM results, keyed by a hash of everything that determines the answer.
+
+    Entries are kept in an SQLite table and evicted least recently used first once there are more than
+    max_entries of them. Entries older than max_age seconds (if set) are treated as missing. journal_mode is the
+    SQLite journal mode of the table (see SQLiteStorage.open_sqlite).
+    """
+
+    def __init__(self, path='./Cache/llm_results.sqlite', max_entries=200000, max_age=None, journal_mode='WAL'):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = {}
+        self.misses = {}
+
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db = open_sqlite(path, journal_mode)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, kind TEXT, value TEXT, created_at REAL, accessed_at REAL);
+            CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at);
+        ''')
+        self._evict()
+        self._db.commit()
+
+    @staticmethod
+    def make_key(kind, *parts):
+        """Hashes kind and parts (any JSON-serializable values) into a cache key."""
+        return hashlib.sha256(json.dumps([kind, *parts], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get(self, key, kind):
+        """Returns the cached value for key, or None on a miss."""
+        with self._lock:
+            row = self._db.execute('SELECT value, created_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.max_age is not None and time.time() - row[1] > self.max_age:
+                self._db.execute('DELETE FROM results WHERE key = ?', (key,))
+                self._db.commit()
+                row = None
+
+            if row is None:
+                self.misses[kind] = self.misses.get(kind, 0) + 1
+                return None
+
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            self._db.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            return json.loads(row[0])
+
+    def put(self, key, kind, value):
+        """Stores value (any JSON-serializable value) under key."""
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                             (key, kind, json.dumps(value, ensure_ascii=False), now, now))
+            self._puts += 1
+            if self._puts % 1000 == 0:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drops the least recently used entries beyond max_entries. Caller holds the lock."""
+        count = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute('DELETE FROM results WHERE key IN '
+                             '(SELECT key FROM results ORDER BY accessed_at LIMIT ?)', (count - self.max_entries,))
+
+    def summary(self):
+        kinds = sorted(set(self.hits) | set(self.misses))
+        stats = ', '.join(f"{kind}: {self.hits.get(kind, 0)} hits / {self.misses.get(kind, 0)} misses" for kind in kinds)
+        return f"LLM result cache: {stats or 'unused'}."
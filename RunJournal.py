@@ -0,0 +1,104 @@
+import os
+import json
+import threading
+
+
+class RunJournal:
+    """
+    Append-only JSON-lines journal of a run's finished rows and relevance results.
+
+    Every finished row and every relevance batch is written and flushed as soon as it completes, so a crashed
+    or cancelled run can be resumed from the journal. When a URL appears more than once, the last entry wins.
+    Rows stay on disk: only their byte offsets and event names are kept in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.names = {}
+        self.failed = set()
+        self.relevance = {}
+        self.max_width = 0
+        self._lock = threading.Lock()
+
+        torn = False
+        if os.path.exists(path):
+            torn = self._load()
+        self._file = open(path, 'ab')
+        if torn:
+            self._file.write(b'\n')
+        self._reader = open(path, 'rb')
+
+    def _load(self):
+        """Loads an existing journal. Returns True if its last line was cut off by a crash."""
+        line = b'\n'
+        offset = 0
+        with open(self.path, 'rb') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    entry = {'kind': None}
+                if entry['kind'] == 'row':
+                    self._index_row(entry['url'], entry['row'], entry['ok'], offset)
+                elif entry['kind'] == 'relevance':
+                    self.relevance.update(zip(entry['urls'], entry['results']))
+                offset += len(line)
+        return not line.endswith(b'\n')
+
+    def _index_row(self, url, row, ok, offset):
+        self.offsets[url] = offset
+        self.names[url] = row[0] if row else ''
+        self.max_width = max(self.max_width, len(row))
+        if ok:
+            self.failed.discard(url)
+        else:
+            self.failed.add(url)
+
+    def _append(self, entry):
+        """Appends entry and returns its byte offset. Caller holds the lock."""
+        offset = self._file.tell()
+        self._file.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        return offset
+
+    def record_row(self, url, row, ok=True):
+        """
+        Records the finished row for url. Rows recorded with ok=False are retried on resume. Rows finished by
+        threads a cancelled run no longer waits for may arrive after close; they are dropped.
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            offset = self._append({'kind': 'row', 'url': url, 'ok': ok, 'row': row})
+            self._index_row(url, row, ok, offset)
+
+    def record_relevance(self, urls, results):
+        """Records the relevance results of one batch."""
+        with self._lock:
+            self._append({'kind': 'relevance', 'urls': list(urls), 'results': list(results)})
+            self.relevance.update(zip(urls, results))
+
+    def has_row(self, url):
+        return url in self.offsets
+
+    def read_row(self, url):
+        """Reads the latest row recorded for url back from disk."""
+        with self._lock:
+            self._reader.seek(self.offsets[url])
+            return json.loads(self._reader.readline())['row']
+
+    def completed_urls(self):
+        """Returns the URLs whose rows finished successfully."""
+        return set(self.offsets) - self.failed
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self._reader.close()
+
+    def discard(self):
+        """Closes and deletes the journal once the run's output has been written."""
+        self.close()
+        os.remove(self.path)
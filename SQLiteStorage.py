@@ -0,0 +1,20 @@
+import os
+import sqlite3
+
+
+def open_sqlite(path, journal_mode='WAL', **kwargs):
+    """
+    Opens the SQLite database at path, creating its directory, for use from several threads and processes.
+
+    Write-ahead logging lets readers and one writer work at once, so worker processes (see Worker.py) can share
+    the database; a writer waits up to a minute for the lock. WAL needs shared memory between the processes, so
+    it does not work on a network filesystem: pass journal_mode='DELETE' for a database used from several
+    machines. journal_mode=None keeps the mode the database was created with. kwargs go to sqlite3.connect.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=60, **kwargs)
+    if journal_mode:
+        connection.execute(f'PRAGMA journal_mode={journal_mode}')
+    return connection
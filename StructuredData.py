@@ -0,0 +1,161 @@
+import re
+import json
+import html
+from datetime import datetime
+
+
+# Output columns are matched to event properties by the words in their names, checked in this order
+FIELD_KEYWORDS = [
+    ('organizer', ('organizer', 'organiser', 'host', 'organization')),
+    ('startDate', ('start', 'begins')),
+    ('endDate', ('end', 'ends', 'finish')),
+    ('location', ('location', 'address', 'venue', 'where', 'place')),
+    ('description', ('description', 'summary', 'about', 'details')),
+    ('name', ('name', 'title', 'event')),
+]
+
+# OpenGraph and event meta tags that can fill properties missing from the JSON-LD
+META_PROPERTIES = {
+    'name': ('og:title',),
+    'description': ('og:description', 'description'),
+    'startDate': ('event:start_time', 'og:start_time'),
+    'endDate': ('event:end_time', 'og:end_time'),
+}
+
+
+class StructuredData:
+    """
+    Reads event details from a page's schema.org JSON-LD Event object and its OpenGraph/event meta tags.
+
+    extract returns the values in the order of the column mapping, formatted like the LLM output, or None if any
+    column cannot be filled, in which case the page goes to the LLM as before.
+    """
+
+    def __init__(self, column_mapping):
+        self.columns = list(column_mapping)
+        self.properties = [self.property_for(column) for column in self.columns]
+
+    @staticmethod
+    def property_for(column):
+        words = re.findall(r'[a-z]+', column.lower())
+        for prop, keywords in FIELD_KEYWORDS:
+            if any(word in keywords for word in words):
+                return prop
+        return None
+
+    @staticmethod
+    def is_event(node):
+        types = node.get('@type', [])
+        types = types if isinstance(types, list) else [types]
+        return any(isinstance(t, str) and t.endswith('Event') for t in types)
+
+    @classmethod
+    def find_event(cls, node):
+        """Returns the first Event object in a JSON-LD document, searching lists and @graph."""
+        if isinstance(node, list):
+            for item in node:
+                event = cls.find_event(item)
+                if event is not None:
+                    return event
+        elif isinstance(node, dict):
+            if cls.is_event(node):
+                return node
+            return cls.find_event(node.get('@graph'))
+        return None
+
+    @classmethod
+    def json_ld_event(cls, document):
+        for script in document.select('script[type="application/ld+json"]'):
+            try:
+                data = json.loads(script.text())
+            except ValueError:
+                continue
+            event = cls.find_event(data)
+            if event is not None:
+                return event
+        return None
+
+    @staticmethod
+    def clean_text(value):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, dict):
+            value = value.get('name')
+        if not isinstance(value, str):
+            return None
+        return ' '.join(html.unescape(re.sub(r'<[^>]+>', ' ', value)).split()) or None
+
+    @staticmethod
+    def format_datetime(value):
+        if not isinstance(value, str):
+            return None
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed.strftime('%B %d, %Y, %I:%M %p')
+
+    @classmethod
+    def format_location(cls, location):
+        if isinstance(location, list):
+            location = next((item for item in location if not (isinstance(item, dict)
+                                                              and item.get('@type') == 'VirtualLocation')),
+                            location[0] if location else None)
+        if isinstance(location, str):
+            return cls.clean_text(location)
+        if not isinstance(location, dict):
+            return None
+        if location.get('@type') == 'VirtualLocation':
+            return 'Online'
+
+        address = location.get('address')
+        if isinstance(address, str):
+            return cls.clean_text(address)
+        if isinstance(address, dict):
+            parts = [address.get(key) for key in ('streetAddress', 'addressLocality', 'addressRegion')]
+            parts = [part for part in parts if isinstance(part, str) and part.strip()]
+            postal_code = address.get('postalCode')
+            text = ', '.join(part.strip() for part in parts)
+            if isinstance(postal_code, str) and postal_code.strip():
+                text = f"{text} {postal_code.strip()}"
+            return text.strip() or None
+        return cls.clean_text(location.get('name'))
+
+    @staticmethod
+    def meta_values(document):
+        metas = {}
+        for meta in document.select('meta[content]'):
+            attrs = meta.attrs
+            for key in (attrs.get('property'), attrs.get('name')):
+                if key and attrs['content']:
+                    metas.setdefault(key, attrs['content'])
+
+        values = {}
+        for prop, names in META_PROPERTIES.items():
+            for name in names:
+                if name in metas:
+                    values[prop] = metas[name]
+                    break
+        return values
+
+    def extract(self, document):
+        """
+        Returns the event details of a page parsed with HTMLParsing.parse_html in column mapping order,
+        or None if any is missing.
+        """
+        if None in self.properties:
+            return None
+
+        event = self.json_ld_event(document) or {}
+        raw = {**self.meta_values(document), **{key: value for key, value in event.items() if value}}
+
+        values = {
+            'name': self.clean_text(raw.get('name')),
+            'startDate': self.format_datetime(raw.get('startDate')),
+            'endDate': self.format_datetime(raw.get('endDate')),
+            'location': self.format_location(raw.get('location')),
+            'description': self.clean_text(raw.get('description')),
+            'organizer': self.clean_text(raw.get('organizer')),
+        }
+        details = [values[prop] for prop in self.properties]
+        return None if None in details else details
@@ -0,0 +1,56 @@
+import time
+import threading
+
+from SQLiteStorage import open_sqlite
+
+
+class URLLedger:
+    """
+    Persistent record of the event URLs extracted by earlier runs, keyed by normalized URL
+    (see URLNormalization.url_keys), with each URL's status, time and output file.
+
+    Runs skip URLs already extracted successfully; failed URLs are always retried. Pass max_age (seconds) to
+    known to treat older entries as stale, so those events are extracted again. journal_mode is the SQLite
+    journal mode of the ledger (see SQLiteStorage.open_sqlite).
+    """
+
+    # SQLite limits the number of parameters of one statement
+    BATCH_SIZE = 500
+
+    def __init__(self, path='./Cache/url_ledger.sqlite', journal_mode='WAL'):
+        self._lock = threading.Lock()
+        self._db = open_sqlite(path, journal_mode)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS urls (
+                key TEXT PRIMARY KEY, url TEXT, status TEXT, processed_at REAL, output_file TEXT);
+            CREATE INDEX IF NOT EXISTS urls_processed_at ON urls (processed_at);
+        ''')
+        self._db.commit()
+
+    def known(self, keys, max_age=None):
+        """Returns the subset of keys extracted successfully, within the last max_age seconds if given."""
+        keys = list(keys)
+        cutoff = time.time() - max_age if max_age is not None else 0
+        found = set()
+        with self._lock:
+            for start in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[start:start + self.BATCH_SIZE]
+                rows = self._db.execute(
+                    f"SELECT key FROM urls WHERE status = 'ok' AND processed_at >= ? "
+                    f"AND key IN ({', '.join('?' * len(batch))})", (cutoff, *batch)).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def record(self, entries, output_file):
+        """Records (key, url, ok) entries as processed now, into output_file."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO urls (key, url, status, processed_at, output_file) VALUES (?, ?, ?, ?, ?)',
+                [(key, url, 'ok' if ok else 'error', now, output_file) for key, url, ok in entries])
+            self._db.commit()
+
+    def summary(self):
+        with self._lock:
+            counts = dict(self._db.execute('SELECT status, COUNT(*) FROM urls GROUP BY status').fetchall())
+        return f"URL ledger: {counts.get('ok', 0)} extracted URLs, {counts.get('error', 0)} failed URLs."
@@ -0,0 +1,34 @@
+import re
+
+
+# scheme://netloc/path?query#fragment, with a non-empty netloc
+URL_PATTERN = (r'^(?P<scheme>[A-Za-z][A-Za-z0-9+.\-]*)://(?P<netloc>[^/?#]+)(?P<path>[^?#]*)'
+               r'(?:\?(?P<query>[^#]*))?(?:#(?P<fragment>.*))?$')
+URL_REGEX = re.compile(URL_PATTERN)
+
+
+def split_urls(urls):
+    """Splits a Series of URLs into a DataFrame of their parts, with NaN parts for values that are not URLs."""
+    return urls.fillna('').astype(str).str.strip().str.extract(URL_PATTERN)
+
+
+def strip_parameters(parts):
+    """Rebuilds the URLs from split_urls parts without their query, with a lowercase scheme."""
+    fragment = ('#' + parts['fragment']).fillna('')
+    return parts['scheme'].str.lower() + '://' + parts['netloc'] + parts['path'] + fragment
+
+
+def url_keys(parts):
+    """
+    Returns the deduplication keys of the URLs from split_urls parts: lowercase scheme and host, the path
+    without trailing slashes, and no query or fragment.
+    """
+    return parts['scheme'].str.lower() + '://' + parts['netloc'].str.lower() + parts['path'].str.rstrip('/')
+
+
+def normalize_url(url):
+    """Returns the deduplication key of a single URL, or None if it is not a URL."""
+    match = URL_REGEX.match(str(url).strip())
+    if match is None:
+        return None
+    return f"{match['scheme'].lower()}://{match['netloc'].lower()}{match['path'].rstrip('/')}"
@@ -1,9 +1,12 @@
 import os
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 
+from HTTPCache import HTTPCache, cached_session
+from NetArchive import NetArchive
+from HTMLParsing import parse_html
+
 # Base URL without city and term
 URL_TEMPLATE = "https://www.eventbrite.com/d/{city}/{term}/?page="
 
@@ -16,6 +19,15 @@ headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
+# Set to a file path to record every response of this run into a network archive, and ARCHIVE_MODE to
+# 'replay' to serve them back from it without any network (see NetArchive.py)
+ARCHIVE_PATH = None
+ARCHIVE_MODE = 'record'
+
+# Listing pages change more often than event pages, so they are revalidated sooner
+session = cached_session(HTTPCache(ttl=6 * 3600), headers,
+                         archive=NetArchive(ARCHIVE_PATH, ARCHIVE_MODE) if ARCHIVE_PATH else None)
+
 def ensure_directory_exists(directory):
     """Ensure that the output directory exists."""
     if not os.path.exists(directory):
@@ -29,11 +41,11 @@ def seconds_to_hms(seconds):
 
 def get_event_links(url):
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = session.get(url, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        events = soup.select('.horizontal-event-card__action-visibility .Stack_root__1ksk7 a')
-        return [event['href'] for event in events if event.has_attr('href')]
+        document = parse_html(response.content)
+        events = document.select('.horizontal-event-card__action-visibility .Stack_root__1ksk7 a[href]')
+        return [event['href'] for event in events]
     except requests.RequestException as e:
         print(f"Request error for {url}: {e}")
         return []
@@ -1,15 +1,26 @@
-import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 import os
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 
+from HTTPCache import HTTPCache, cached_session
+from NetArchive import NetArchive
+from HTMLParsing import parse_html
+
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
+# Set to a file path to record every response of this run into a network archive, and ARCHIVE_MODE to
+# 'replay' to serve them back from it without any network (see NetArchive.py)
+ARCHIVE_PATH = None
+ARCHIVE_MODE = 'record'
+
+# Listing pages change more often than event pages, so they are revalidated sooner
+session = cached_session(HTTPCache(ttl=6 * 3600), headers,
+                         archive=NetArchive(ARCHIVE_PATH, ARCHIVE_MODE) if ARCHIVE_PATH else None)
+
 # List of web pages to scrape
 web_pages = [
     'https://www.weact.org/latest/events/',
@@ -21,24 +32,23 @@ web_pages = [
 ]
 
 
-def ClimateMuseum_parser(soup):
-        # Find the parent div with the specified class
-        containers = soup.find_all('div',class_='summary-item summary-item-record-type-event sqs-gallery-design-carousel-slide summary-item-has-thumbnail summary-item-has-excerpt summary-item-has-tags summary-item-has-author summary-item-has-location')
-
-        for container in containers:
-            anchors = container.find_all('a', href=True)
+def ClimateMuseum_parser(document):
+        # Find the anchors in the event summary divs
+        anchors = document.select('div.summary-item.summary-item-record-type-event.sqs-gallery-design-carousel-slide'
+                                  '.summary-item-has-thumbnail.summary-item-has-excerpt.summary-item-has-tags'
+                                  '.summary-item-has-author.summary-item-has-location a[href]')
 
-        return ['https://climatemuseum.org' + anchor['href'] for anchor in anchors if anchor.has_attr('href')]
+        return ['https://climatemuseum.org' + anchor['href'] for anchor in anchors]
 
 
-def reti_parser(soup):
+def reti_parser(document):
     # Select all anchors with the specific classes
-    anchors = soup.select('a.eventlist-button.sqs-editable-button.sqs-button-element--primary')
+    anchors = document.select('a.eventlist-button.sqs-editable-button.sqs-button-element--primary[href]')
 
     # Extract hrefs from the anchors
-    return ['https://www.reticenter.org' + anchor['href'] for anchor in anchors if anchor.has_attr('href')]
+    return ['https://www.reticenter.org' + anchor['href'] for anchor in anchors]
 
-def Columbia_parser(soup):
+def Columbia_parser(document):
     chrome_options = Options()
     chrome_options.add_argument("--headless=new")
     driver = webdriver.Chrome(options=chrome_options)
@@ -56,35 +66,31 @@ def Columbia_parser(soup):
     # Close the browser
     driver.quit()
 
-    # Parse the page source with BeautifulSoup
-    soup = BeautifulSoup(page_source, 'html.parser')
+    # Parse the rendered page source
+    document = parse_html(page_source)
 
     # Find all 'a' tags under 'h2' tags
-    anchors = soup.select('h2 a')
+    anchors = document.select('h2 a[href]')
 
-    return ['https://www.climate.columbia.edu' + anchor['href'] for anchor in anchors if anchor.has_attr('href')]
+    return ['https://www.climate.columbia.edu' + anchor['href'] for anchor in anchors]
 
-def NYCleanPower_parser(soup):
-    # Find all anchors with class "evcal_col50 dark1 bordr evo_clik_row"
-    anchors = soup.select('a.evcal_col50.dark1.bordr.evo_clik_row')
+def NYCleanPower_parser(document):
+    # Find all anchors with class "evcal_col50 dark1 bordr evo_clik_row" that have the href attribute
+    anchors = document.select('a.evcal_col50.dark1.bordr.evo_clik_row[href]')
 
-    # Extract hrefs from the anchors that have the href attribute
-    return [anchor['href'] for anchor in anchors if anchor.has_attr('href')]
+    return [anchor['href'] for anchor in anchors]
 
-def weact_parser(soup):
-    # Find the div with id "future"
-    future_div = soup.find('div', id='future')
+def weact_parser(document):
+    # Extract hrefs from the anchor tags with class "button button_grey" within the div with id "future"
+    anchors = document.select('div#future a.button.button_grey[href]')
 
-    # If the div is found, extract hrefs from the anchor tags with class "button button_grey" within it
-    return [anchor['href'] for anchor in
-            future_div.find_all('a', class_='button button_grey', href=True)] if future_div else []
+    return [anchor['href'] for anchor in anchors]
 
-def waterfront_parser(soup):
+def waterfront_parser(document):
     # Find all anchors with the title "View Event Website"
-    anchors = soup.find_all('a', attrs={'title': 'View Event Website', 'target': '_blank'})
+    anchors = document.select('a[title="View Event Website"][target="_blank"][href]')
 
-    # Extract hrefs from the anchors that have the href attribute
-    return [anchor['href'] for anchor in anchors if anchor.has_attr('href')]
+    return [anchor['href'] for anchor in anchors]
 
 
 # Map web pages to their custom parsers
@@ -129,10 +135,10 @@ for index, web_page in enumerate(web_pages):
         continue
 
     try:
-        response = requests.get(web_page, headers=headers)
+        response = session.get(web_page)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        urls = custom_parsers[web_page](soup)
+        document = parse_html(response.content)
+        urls = custom_parsers[web_page](document)
         all_urls.extend([(url, web_page) for url in urls])
 
         page_end_time = time.time()
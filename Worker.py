@@ -0,0 +1,221 @@
+"""
+Headless extraction across processes and machines.
+
+    python Worker.py create run.queue settings.json --job-size 50
+    python Worker.py work run.queue --workers 8
+    python Worker.py status run.queue
+
+settings.json holds the EventExtractor keyword arguments (api_key_env, csv_files, column_mapping, city, ...).
+create reads the URLs once and splits them into jobs. Every worker, on this machine or (for a queue created
+with --multi-host) on another one sharing the filesystem, claims jobs until none are left, and the last one to finish merges the jobs into the usual
+output and Cleaned_ CSVs. A crashed worker's job is claimed again once its lease runs out; run work again, or
+merge with --force, to finish a queue whose workers all died. A queue is merged only once: the merge deletes
+the job journals.
+"""
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+
+from JobQueue import JobQueue
+from RunJournal import RunJournal
+
+
+def job_journal_path(output_file, job_id):
+    return f"{os.path.splitext(output_file)[0]}.job{job_id}.journal.jsonl"
+
+
+def worker_name(number=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{number}"
+
+
+def worker_file(path, number):
+    """Gives each worker process its own copy of a per-run file, such as the metrics file."""
+    base, extension = os.path.splitext(path)
+    return f"{base}.{socket.gethostname()}-{os.getpid()}-{number}{extension}"
+
+
+def create(queue_path, settings, job_size=50, multi_host=False):
+    """
+    Reads the URLs of the run described by settings and queues them in jobs of job_size URLs. With multi_host,
+    the queue and the run's caches use SQLite's rollback journal, which works on a network filesystem.
+    """
+    from EventExtractor import EventExtractor
+
+    settings = dict(settings)
+    settings.pop('resume_from', None)
+    if multi_host:
+        settings['sqlite_journal_mode'] = 'DELETE'
+    extractor = EventExtractor(**settings)
+    urls, additional_data = extractor.read_urls_from_csv()
+
+    # Every worker writes into the same output, named once here
+    settings['output_file'] = os.path.abspath(extractor.output_file)
+    queue = JobQueue.create(queue_path, settings, urls, additional_data, job_size=job_size, multi_host=multi_host)
+    print(f"Queued {len(urls)} URLs in {len(queue.job_ids())} jobs. Output: {settings['output_file']}")
+    queue.close()
+
+
+def heartbeat(queue_path, job_id, worker, lease_seconds, done, lost):
+    """Renews worker's lease on a job until done is set. Sets lost if the job was given to another worker."""
+    queue = JobQueue(queue_path)
+    while not done.wait(lease_seconds / 3):
+        if not queue.renew(job_id, worker, lease_seconds):
+            print(f"Lost the lease on job {job_id}, stopping it.")
+            lost.set()
+            break
+    queue.close()
+
+
+def process_job(queue_path, extractor, job_id, urls, worker, lease_seconds):
+    """
+    Extracts the URLs of a job into the job's own journal. A retried job resumes from that journal.
+    Returns False if the job was given to another worker before it finished.
+    """
+    journal = RunJournal(job_journal_path(extractor.output_file, job_id))
+    done = threading.Event()
+    lost = threading.Event()
+    renewer = threading.Thread(target=heartbeat, args=(queue_path, job_id, worker, lease_seconds, done, lost),
+                               daemon=True)
+    renewer.start()
+    try:
+        extractor.extract(urls, lost, journal=journal)
+    finally:
+        done.set()
+        renewer.join()
+        journal.close()
+    return not lost.is_set()
+
+
+def merge(queue, extractor):
+    """Copies the rows of every job journal into the run's journal and writes the output and cleaned CSVs."""
+    urls, additional_data = queue.inputs()
+    paths = [job_journal_path(extractor.output_file, job_id) for job_id in queue.job_ids()]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        job_journal = RunJournal(path)
+        for url in job_journal.offsets:
+            extractor.journal.record_row(url, job_journal.read_row(url), ok=url not in job_journal.failed)
+        job_journal.close()
+
+    failed_jobs = queue.counts().get('failed', 0)
+    if failed_jobs:
+        print(f"{failed_jobs} jobs were given up after {queue.max_attempts} attempts; "
+              f"their unfinished URLs are left out.")
+    extractor.finish(urls, additional_data)
+    # Only once the output is written are the job journals deleted, and the merge never runs again without them
+    queue.mark_merged()
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def work(queue_path, number=0, lease_seconds=300, poll_seconds=5):
+    """Claims and processes jobs until the queue is finished, then merges the output if no other worker has."""
+    worker = worker_name(number)
+    queue = JobQueue(queue_path)
+    settings = queue.get_config('settings')
+    settings['metrics_file'] = worker_file(settings.get('metrics_file') or
+                                           os.path.splitext(settings['output_file'])[0] + '.metrics.json', number)
+    if settings.get('prometheus_file'):
+        settings['prometheus_file'] = worker_file(settings['prometheus_file'], number)
+    from EventExtractor import EventExtractor
+    extractor = EventExtractor(**settings)
+
+    extractor.start_metrics()
+    try:
+        while True:
+            job = queue.claim(worker, lease_seconds)
+            if job is None:
+                if queue.finished():
+                    break
+                # Other workers hold the remaining jobs; wait in case one of them crashes
+                time.sleep(poll_seconds)
+                continue
+
+            job_id, urls = job
+            print(f"[{worker}] Job {job_id}: {len(urls)} URLs.")
+            if process_job(queue_path, extractor, job_id, urls, worker, lease_seconds):
+                queue.complete(job_id, worker)
+
+        if queue.claim_merge(worker):
+            print(f"[{worker}] All jobs finished, merging.")
+            merge(queue, extractor)
+    finally:
+        extractor.write_metrics()
+        queue.close()
+
+
+def status(queue_path):
+    queue = JobQueue(queue_path)
+    counts = queue.counts()
+    merged_by = queue.get_config('merged_by')
+    merge_state = '.'
+    if merged_by:
+        merge_state = f". Merged by {merged_by}." if queue.merged() else f". Being merged by {merged_by}."
+    print(', '.join(f"{count} {state}" for state, count in sorted(counts.items())) + merge_state)
+    queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-process event extraction.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = commands.add_parser('create', help="Queue the URLs of a run.")
+    create_parser.add_argument('queue')
+    create_parser.add_argument('settings', help="JSON file of EventExtractor keyword arguments.")
+    create_parser.add_argument('--job-size', type=int, default=50)
+    create_parser.add_argument('--multi-host', action='store_true',
+                               help="Workers on other machines share the queue over a network filesystem.")
+
+    work_parser = commands.add_parser('work', help="Process jobs until the queue is finished.")
+    work_parser.add_argument('queue')
+    work_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    work_parser.add_argument('--lease', type=float, default=300, help="Lease duration in seconds.")
+
+    merge_parser = commands.add_parser('merge', help="Write the output CSVs of a finished queue.")
+    merge_parser.add_argument('queue')
+    merge_parser.add_argument('--force', action='store_true',
+                              help="Merge even if jobs are unfinished or another merge was interrupted.")
+
+    status_parser = commands.add_parser('status', help="Show the job counts of a queue.")
+    status_parser.add_argument('queue')
+
+    args = parser.parse_args()
+    if args.command == 'create':
+        with open(args.settings, 'r', encoding='utf-8') as file:
+            create(args.queue, json.load(file), job_size=args.job_size, multi_host=args.multi_host)
+    elif args.command == 'work':
+        # Spawned workers start clean instead of inheriting this process's threads and connections
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=work, args=(args.queue, number, args.lease))
+                     for number in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    elif args.command == 'merge':
+        queue = JobQueue(args.queue)
+        if queue.merged():
+            print(f"The queue was merged already into {queue.get_config('settings')['output_file']}.")
+        elif not queue.finished() and not args.force:
+            print("The queue has unfinished jobs; pass --force to merge what is done.")
+        elif queue.claim_merge(worker_name(), force=args.force):
+            from EventExtractor import EventExtractor
+            extractor = EventExtractor(**queue.get_config('settings'))
+            merge(queue, extractor)
+            extractor.write_metrics()
+        else:
+            print(f"The queue is being merged by {queue.get_config('merged_by')}; pass --force if that merge "
+                  f"was interrupted.")
+        queue.close()
+    else:
+        status(args.queue)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Headless entry point: runs an extraction from a JSON or TOML config file, for servers and cron.
+
+    python cli.py run.toml
+    python cli.py run.toml --check          # validate the config and show the settings, without running
+    python cli.py run.toml --resume Output/NYC_events_2024_01_01_00_00_00.csv
+
+Example config (TOML):
+
+    api_key_env = "OPENAI_API_KEY"      # name of the environment variable holding the key
+    csv_files = ["CSV_URL_DATA/Climate Tech/eventbrite_climate_ny--new-york.csv"]
+    num_rows = ["MAX"]                  # or an int, or one value per CSV file
+    identifier = "NYC"                  # names the output file, like the City field of the app
+    terms = "climate"                   # "climate", "ai_governance" or a list of terms
+    output_dir = "Output"
+
+    [column_mapping]                    # optional; defaults to the app's mapping
+    "Event Name" = "The name of the event"
+
+    [options]                           # any other EventExtractor keyword arguments
+    max_concurrent_fetches = 32
+
+Heavy modules (pandas, openai, the HTML parsers) are only imported once a run starts, so --help and --check
+return at once. SIGINT and SIGTERM stop the run within about a second and write what is finished to _PARTIAL
+output CSVs; run again with --resume to finish it. A second signal exits at once, without the partial output.
+"""
+import os
+import sys
+import json
+import argparse
+
+
+# The default column mapping of the app, in its "Column: prompt" format
+DEFAULT_COLUMN_MAPPING = '''Event Name: The name of the event
+Start: The start datetime of the event in the following format: Month Day, Year, Hour:Minute AM/PM
+End: The end datetime of the event in the following format: Month Day, Year, Hour:Minute AM/PM
+Location: The full address of the event
+Description: A description of the event
+Organizer: The organizer of the event'''
+
+TERM_LISTS = ('climate', 'ai_governance')
+
+SETTINGS = {'csv_files', 'num_rows', 'column_mapping', 'identifier', 'city', 'terms', 'output_dir', 'api_key_env',
+            'options'}
+
+
+class ConfigError(Exception):
+    """Raised when a config file is missing a setting or has an invalid one."""
+    pass
+
+
+def load_config(path):
+    """Reads a JSON or TOML (by extension) config file into a dict."""
+    if path.endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as file:
+            return tomllib.load(file)
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def parse_column_mapping(value):
+    """Accepts a {column: prompt} table or the app's text format of one 'Column: prompt' per line."""
+    if isinstance(value, dict):
+        return {str(column): str(prompt) for column, prompt in value.items()}
+    if isinstance(value, str):
+        return dict(line.strip().split(": ", 1) for line in value.splitlines() if line.strip())
+    raise ConfigError("column_mapping must be a table or 'Column: prompt' lines.")
+
+
+def parse_num_rows(value, csv_count):
+    values = value if isinstance(value, list) else [value]
+    if not values or not all(v == 'MAX' or (isinstance(v, int) and v > 0) for v in values):
+        raise ConfigError("num_rows must be 'MAX', a positive integer, or a list of those.")
+    if len(values) not in (1, csv_count):
+        raise ConfigError(f"num_rows has {len(values)} values for {csv_count} CSV files.")
+    return values
+
+
+def settings_from_config(config, base_dir='.'):
+    """
+    Validates a config and returns the EventExtractor arguments. terms stays a name until the run, so this
+    needs no heavy import. Relative paths are resolved against base_dir, the config file's directory.
+    """
+    def resolve(path):
+        return path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+    csv_files = config.get('csv_files')
+    if isinstance(csv_files, str):
+        csv_files = [csv_files]
+    if not csv_files:
+        raise ConfigError("csv_files must list at least one CSV file.")
+    csv_files = [resolve(path) for path in csv_files]
+    missing = [path for path in csv_files if not os.path.exists(path)]
+    if missing:
+        raise ConfigError(f"CSV files not found: {', '.join(missing)}")
+
+    identifier = config.get('identifier', config.get('city'))
+    if not identifier or not isinstance(identifier, str):
+        raise ConfigError("identifier must be set, e.g. the city of the events.")
+
+    api_key_env = config.get('api_key_env', 'OPENAI_API_KEY')
+    if api_key_env not in os.environ:
+        raise ConfigError(f"The environment variable {api_key_env} holding the OpenAI API key is not set.")
+
+    terms = config.get('terms', 'climate')
+    if isinstance(terms, str) and terms not in TERM_LISTS:
+        raise ConfigError(f"terms must be one of {', '.join(TERM_LISTS)} or a list of terms.")
+    if isinstance(terms, list) and not (terms and all(isinstance(term, str) for term in terms)):
+        raise ConfigError("terms must be a non-empty list of strings.")
+
+    output_dir = resolve(config.get('output_dir', '.'))
+    options = dict(config.get('options', {}))
+    unknown = sorted(set(config) - SETTINGS)
+    if unknown:
+        raise ConfigError(f"Unknown settings: {', '.join(unknown)}. EventExtractor arguments go under [options].")
+
+    return {
+        'api_key_env': api_key_env,
+        'csv_files': csv_files,
+        'column_mapping': parse_column_mapping(config.get('column_mapping', DEFAULT_COLUMN_MAPPING)),
+        'city': identifier,
+        'output_dir': output_dir,
+        'num_rows': parse_num_rows(config.get('num_rows', 'MAX'), len(csv_files)),
+        'terms': terms,
+        **options,
+    }
+
+
+def run(settings, resume_from=None):
+    """Runs the extraction described by settings. Returns the output CSV path, the partial one if cancelled."""
+    import signal
+    import threading
+    import EventExtractor as extractor_module
+
+    settings = dict(settings)
+    terms = settings.pop('terms')
+    if isinstance(terms, str):
+        terms = {'climate': extractor_module.CLIMATE_TERMS,
+                 'ai_governance': extractor_module.AI_GOVERNANCE_TERMS}[terms]
+    settings.setdefault('relevance_terms', terms)
+    if resume_from:
+        settings['resume_from'] = resume_from
+    os.makedirs(settings['output_dir'], exist_ok=True)
+    # EventExtractor logs errors into ./Errors
+    os.makedirs('Errors', exist_ok=True)
+
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        print(f"Received signal {signum}, stopping; send it again to exit at once...")
+        stop_event.set()
+        # A second signal is not swallowed: it ends the process without the partial output
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    extractor = extractor_module.EventExtractor(**settings)
+    extractor.run(stop_event)
+    return extractor.writer.partial_file if extractor.partial else extractor.get_output_file()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an event extraction from a JSON or TOML config file.")
+    parser.add_argument('config', help="Config file (.json or .toml).")
+    parser.add_argument('--resume', metavar='OUTPUT_CSV',
+                        help="Continue an unfinished run, given its output CSV or journal.")
+    parser.add_argument('--check', action='store_true', help="Validate the config and print the settings.")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+        settings = settings_from_config(config, os.path.dirname(os.path.abspath(args.config)))
+    except (OSError, ValueError, ConfigError) as e:
+        parser.error(f"{args.config}: {e}")
+
+    if args.check:
+        print(json.dumps(settings, indent=2))
+        return 0
+
+    output_file = run(settings, resume_from=args.resume)
+    if output_file.endswith('_PARTIAL.csv'):
+        print(f"Cancelled: {output_file}")
+        # The partial output is written; exit without waiting for the LLM requests still in flight
+        sys.stdout.flush()
+        os._exit(1)
+    print(f"Done: {output_file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
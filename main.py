@@ -1,14 +1,14 @@
 import os
 import sys
+import queue
 import pickle
 import subprocess
 import threading
 import traceback
+from datetime import datetime
 from tkinter import filedialog, ttk
 import tkinter as tk
 
-from EventExtractor import EventExtractor
-
 
 class Tooltip:
     def __init__(self, widget, text):
@@ -51,18 +51,66 @@ class Tooltip:
 
 
 class Console(tk.Text):
-    def __init__(self, *args, **kwargs):
+    """
+    Text widget showing everything printed, from any thread. write only queues the text and tees it to log_path;
+    the Tk main loop inserts the queued text every poll_ms, in one batch, and keeps the last max_lines lines.
+    Text written after close is dropped.
+    """
+
+    def __init__(self, *args, max_lines=2000, poll_ms=100, log_path=None, **kwargs):
         tk.Text.__init__(self, *args, **kwargs)
+        self.max_lines = max_lines
+        self.poll_ms = poll_ms
+        self.queue = queue.SimpleQueue()
+        self.log_file = None
+        self.closed = False
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+            self.log_file = open(log_path, 'a', encoding='utf-8', buffering=1)
+        self._log_lock = threading.Lock()
         sys.stdout = self
+        self.after(self.poll_ms, self.drain)
 
     def write(self, txt):
-        self.config(state='normal')
-        self.insert(tk.END, str(txt))
-        self.see(tk.END)  # Scroll to the end
-        self.config(state='disabled')
+        txt = str(txt)
+        with self._log_lock:
+            if self.closed:
+                return
+            self.queue.put(txt)
+            if self.log_file is not None:
+                self.log_file.write(txt)
+
+    def drain(self):
+        chunks = []
+        try:
+            while True:
+                chunks.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if chunks:
+            self.config(state='normal')
+            self.insert(tk.END, ''.join(chunks))
+            # Only the last max_lines lines are kept, so long runs do not slow the widget down
+            excess = int(self.index('end-1c').split('.')[0]) - self.max_lines
+            if excess > 0:
+                self.delete('1.0', f'{excess + 1}.0')
+            self.see(tk.END)  # Scroll to the end
+            self.config(state='disabled')
+        self.after(self.poll_ms, self.drain)
 
     def flush(self):
-        pass
+        with self._log_lock:
+            if self.log_file is not None:
+                self.log_file.flush()
+
+    def close(self):
+        sys.stdout = sys.__stdout__
+        with self._log_lock:
+            self.closed = True
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
 
 
 class App:
@@ -76,10 +124,11 @@ Description: A description of the event
 Organizer: The organizer of the event'''
 
         self.open_file_var = tk.BooleanVar()
+        self.resume_var = tk.BooleanVar()
         self.root = root
         self.root.title("Event Extractor")
         window_width = 530
-        window_height = 410
+        window_height = 440
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
         position_top = int(screen_height / 2 - window_height / 2)
@@ -118,11 +167,13 @@ Organizer: The organizer of the event'''
         self.label_output = tk.Label(root, text="Select Output:")
         self.label_num_rows = tk.Label(root, text="Rows to Process:")
         self.checkbox_open_file = tk.Checkbutton(root, text="Open file upon completion", variable=self.open_file_var)
+        self.checkbox_resume = tk.Checkbutton(root, text="Resume last run", variable=self.resume_var)
 
         # Add tooltips to buttons
         csv_tooltip = Tooltip(self.button_csv, "Shift click to select multiple csv files")
         output_dir_tooltip = Tooltip(self.button_output_dir, "Browse for the output directory")
         api_key_tooltip = Tooltip(self.entry_api_key, "Input API key environment variable")
+        resume_tooltip = Tooltip(self.checkbox_resume, "Continue the last run, skipping URLs it already finished")
 
         # Add tooltips to text widgets
         city_tooltip = Tooltip(self.entry_city, "The city name(s) are a good pick")
@@ -132,6 +183,7 @@ Organizer: The organizer of the event'''
 
         self.scrollbar_column_mapping = tk.Scrollbar(root, orient=tk.HORIZONTAL, command=self.column_mapping_text.xview)
         self.open_file_var.set(False)
+        self.resume_var.set(False)
 
         # Grid Placement
         padx_std = 15
@@ -162,6 +214,7 @@ Organizer: The organizer of the event'''
         self.button_run.grid(row=9, column=0, pady=pady_std)
         self.button_cancel.grid(row=9, column=1)
         self.checkbox_open_file.grid(padx=12, row=9, column=2, columnspan=2)
+        self.checkbox_resume.grid(padx=padx_std, row=10, column=0, columnspan=2, sticky="w")
 
         # Load saved data
         if os.path.exists('saved_data.pkl'):
@@ -234,6 +287,8 @@ Organizer: The organizer of the event'''
             'num_rows': self.entry_num_rows.get('1.0', 'end').strip(),
             'column_mapping': self.column_mapping_text.get('1.0', 'end').strip(),
             'output_directory': self.entry_output_dir.get('1.0', 'end').strip(),
+            'last_output_file': getattr(self, 'last_output_file',
+                                        getattr(self, 'saved_data', {}).get('last_output_file')),
         }
         with open('saved_data.pkl', 'wb') as f:
             pickle.dump(self.saved_data, f)
@@ -247,23 +302,33 @@ Organizer: The organizer of the event'''
         column_mapping_str = self.column_mapping_text.get('1.0', 'end')
         output_dir = self.entry_output_dir.get('1.0', 'end').strip()
         column_mapping = dict(item.split(": ", 1) for item in column_mapping_str.split("\n") if item)
+        resume_from = getattr(self, 'saved_data', {}).get('last_output_file') if self.resume_var.get() else None
 
         try:
-            extractor = EventExtractor(api_key, csv, column_mapping, city, output_dir, num_rows)
-            self.thread = threading.Thread(target=self.run_in_thread, args=(extractor,))
+            # Imported here, so the window opens without waiting for pandas, openai and the HTML parsers
+            from EventExtractor import EventExtractor
+
+            extractor = EventExtractor(api_key, csv, column_mapping, city, output_dir, num_rows,
+                                       resume_from=resume_from)
+            self.last_output_file = extractor.get_output_file()
+            self.save_data()  # So the run can be resumed even if the app is killed
+            # Tk variables are read here: from the worker thread, get() would wait on the main loop
+            self.thread = threading.Thread(target=self.run_in_thread, args=(extractor, self.open_file_var.get()))
             self.thread.start()
         except Exception as e:
             traceback.print_exc()
 
-    def run_in_thread(self, extractor):
+    def run_in_thread(self, extractor, open_file=False):
         # This method will be called in a new thread
         try:
             extractor.run(self.stop_event)
 
-            if self.open_file_var.get():
+            if open_file:
                 # If the checkbox is checked, open the file here.
                 # Replace the following line with the actual code to open your file.
                 output_file_path = extractor.get_output_file()
+                if extractor.partial:
+                    output_file_path = extractor.writer.partial_file
                 subprocess.call(["open", output_file_path])
         except:
             traceback.print_exc()
@@ -285,14 +350,26 @@ app = App(root)
 frame = tk.Frame(root)
 frame.place(x=265, y=10)
 
-console = Console(frame, height=24, width=35, highlightthickness=0, state='disabled')
+console = Console(frame, height=24, width=35, highlightthickness=0, state='disabled',
+                  log_path=datetime.now().strftime('./Logs/console_%Y_%m_%d_%H_%M_%S.log'))
 console.grid(row=0, column=0, )
 
 
+def close_when_done():
+    thread = getattr(app, 'thread', None)
+    if thread is not None and thread.is_alive():
+        # The cancelled run still flushes its partial output; the main loop keeps running, and the log keeps
+        # its last messages, until it is done
+        root.after(100, close_when_done)
+        return
+    console.close()
+    root.destroy()
+
+
 def on_closing():
     app.cancel_event_extractor()
     app.save_data()
-    root.destroy()
+    close_when_done()
 
 
 root.protocol("WM_DELETE_WINDOW", on_closing)
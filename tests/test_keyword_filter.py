@@ -0,0 +1,14 @@
+from KeywordFilter import KeywordFilter
+
+
+def test_terms_match_their_inflections():
+    keywords = KeywordFilter(['Recycling', 'Carbon', 'Technology', 'Sustainability', 'Farmers Market'])
+    texts = ['Bring your recycled bottles', 'Carbons and more', 'New technologies',
+             'A sustainable future', 'The farmers-markets of Brooklyn']
+    assert keywords.count_terms(texts).tolist() == [1, 1, 1, 1, 1]
+
+
+def test_terms_do_not_match_longer_words():
+    keywords = KeywordFilter(['Green', 'Carbon', 'Earth'])
+    texts = ['A night out in Greenpoint', 'Spaghetti carbonara class', 'Earthquake preparedness']
+    assert keywords.count_terms(texts).tolist() == [0, 0, 0]
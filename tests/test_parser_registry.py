@@ -0,0 +1,48 @@
+import os
+import csv
+import glob
+import logging
+
+from ParserRegistry import ParserRegistry, registrable_label
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def process_eventbrite(page):
+    return []
+
+
+def registry():
+    parsers = ParserRegistry(logging.getLogger('test'))
+    parsers.register_label('eventbrite', process_eventbrite)
+    return parsers
+
+
+def csv_urls():
+    for path in glob.glob(os.path.join(ROOT, 'CSV_URL_DATA', '**', '*.csv'), recursive=True):
+        with open(path, newline='', encoding='utf-8', errors='ignore') as file:
+            for row in csv.reader(file):
+                if row and row[0].startswith('http'):
+                    yield row[0]
+
+
+def test_every_eventbrite_url_in_the_url_data_has_the_parser():
+    parsers = registry()
+    urls = [url for url in csv_urls() if 'eventbrite' in ParserRegistry.host(url)]
+    assert urls
+    missing = sorted({ParserRegistry.host(url) for url in urls if parsers.lookup(url) is None})
+    assert missing == []
+
+
+def test_country_domains():
+    for host in ['www.eventbrite.com', 'www.eventbrite.co.uk', 'www.eventbrite.at', 'www.eventbrite.be',
+                 'www.eventbrite.co', 'eventbrite.com.au', 'www.eventbrite.sg']:
+        assert registrable_label(host) == 'eventbrite', host
+
+
+def test_other_sites_have_no_parser():
+    parsers = registry()
+    for url in ['https://eventbrite.example.com/e/1', 'https://www.meetup.com/e/1', 'https://notevents.co.uk/',
+                'https://localhost/']:
+        assert parsers.lookup(url) is None, url
@@ -0,0 +1,36 @@
+import sys
+import json
+import time
+import subprocess
+
+from conftest import ROOT
+
+
+HEAVY_MODULES = ['pandas', 'openai', 'bs4', 'lxml', 'selectolax', 'requests']
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, check=True, capture_output=True, text=True)
+
+
+def best_time(*args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def test_cli_help_starts_fast():
+    interpreter = best_time('-c', 'pass')
+    help_time = best_time('cli.py', '--help')
+    # The heavy modules alone take over a second to import
+    assert help_time - interpreter < 0.3, f"cli.py --help took {help_time - interpreter:.3f}s beyond startup"
+
+
+def test_importing_cli_imports_no_heavy_module():
+    result = run_python('-c', 'import sys, json, cli; print(json.dumps(sorted(sys.modules)))')
+    imported = set(json.loads(result.stdout))
+    assert [module for module in HEAVY_MODULES if module in imported] == []